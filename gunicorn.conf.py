@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn configuration.
+
+Gunicorn loads this file from the current working directory by default:
+
+  $ gunicorn src.wsgi:app
+
+Settings can be overridden with environment variables (see below) or on the
+command line.
+
+Concurrency model: `workers` processes, each serving requests with `threads`
+threads (gthread worker). Requests are mostly I/O-bound (fetching JWKS,
+calling AWS), so threads are cheap. Processes sidestep the GIL for the
+CPU-bound part (RS256 signature verification).
+
+NOTE: Caches (JWKS, AWS credentials, presigned POST requests) and rate limits
+are per process. More threads and fewer processes share them better.
+
+See: https://docs.gunicorn.org/en/stable/settings.html
+"""
+import multiprocessing
+import os
+
+# The socket to bind.
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# The number of worker processes. Defaults to the number of CPUs.
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+
+# The number of threads per worker process.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Load the application (`create_app()`) before forking worker processes, so
+# configuration, validators, and caches are created once and shared
+# copy-on-write.
+preload_app = True
+
+# Restart a worker process after it has served this many requests (plus
+# jitter, so workers do not restart at once). Bounds memory growth.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+# The number of seconds a worker process may be silent before it is killed and
+# restarted.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+# The number of seconds a worker process has to finish serving requests after
+# receiving a restart (or stop) signal.
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# The number of seconds to wait for the next request on a keep-alive
+# connection. Should exceed the idle timeout of any load balancer in front of
+# the application.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 75))
+
+# Log to stdout/stderr. Set GUNICORN_ACCESSLOG to an empty string to disable
+# access logs.
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-") or None
+errorlog = "-"
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark OIDC token verification.
+
+Compares the time to verify a JWT using authlib with the time using the fast
+RS256 path (see: `GitHubActionsOIDCTokenValidator.verify_rs256()`). Keys are
+served from a warm JWKS cache, and the cache of verified OIDC tokens is not
+used, so every iteration verifies the signature and claims.
+
+Usage:
+
+  $ python scripts/benchmark.py [--iterations <n>]
+
+Side Effect: Outputs the time per token for each path to standard output.
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+
+from authlib.jose import JsonWebKey, jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import oidc  # noqa: E402
+from src.claims import CLAIMS  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    private_key = JsonWebKey.generate_key("RSA", 2048, {"kid": "1"}, is_private=True)
+    jwk_set = {"keys": [private_key.as_dict(is_private=False)]}
+    now = int(time.time())
+    payload = {name: name for name in CLAIMS}
+    payload.update(iss=oidc.GITHUB_OPENID_ISSUER_URI, iat=now, nbf=now, exp=now + 3600)
+    header = {"alg": "RS256", "typ": "JWT", "kid": private_key.kid}
+    token = jwt.encode(header, payload, private_key).decode()
+    results = {}
+    for name, fast_verify in [("authlib", False), ("fast", True)]:
+        validator = oidc.GitHubActionsOIDCTokenValidator(
+            public_key=oidc.JWKSCache(fetch_jwk_set=lambda: jwk_set),
+            issuer=oidc.GITHUB_OPENID_ISSUER_URI,
+            fast_verify=fast_verify,
+        )
+        assert validator.verify_token(token) is not None
+        seconds = min(
+            timeit.repeat(
+                lambda: validator.verify_token(token),
+                number=args.iterations,
+                repeat=3,
+            )
+        )
+        results[name] = seconds / args.iterations * 1e6
+        print(f"{name}: {results[name]:.1f} us/token")
+    print(f"speedup: {results['authlib'] / results['fast']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,69 @@
 # -*- coding: utf-8 -*-
 """
 Decode a JWT and output its header, payload, and signature.
+
+Usage:
+
+  $ python scripts/decode.py <token>
+
+Verify JWTs in bulk (ex. for incident response):
+
+  $ python scripts/decode.py verify [--jwks <url|file>] [--issuer <issuer>]
+      [--workers <n>] [--now <timestamp>] [--field <field>] [<file>]
+
+Tokens are read from <file> (or standard input), one per line. Lines may be
+JSON objects (JSONL), in which case the token is read from <field> (default:
+'token'). Tokens are verified against a JSON Web Key Set (JWKS), which is
+either fetched from a URL (default: the issuer's 'jwks_uri') or read from a
+local snapshot. Verification is spread over a pool of worker processes.
+
+For each token, a JSON object is written to standard output as soon as it is
+verified (in input order):
+
+  {"line": 1, "valid": false, "error": "expired_token", "kid": "...",
+   "iss": "...", "sub": "...", "jti": "..."}
+
+Only RS256 is accepted ('error': 'unsupported_algorithm', otherwise). A token
+signed by a key that is not in the JWKS is reported as 'unknown_kid', and a
+line that cannot be parsed as 'invalid_line'. Any other unexpected error is
+reported as 'verification_error', so a single hostile token never aborts the
+run.
+
+Input is read incrementally, so memory use does not grow with the number of
+tokens. Throughput is reported to standard error.
 """
+import argparse
 import base64
+import collections
+import itertools
+import json
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional, TextIO
+
+import requests
+from authlib.jose import JoseError, JsonWebKey, JsonWebToken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import oidc  # noqa: E402
+
+# The number of tokens sent to a worker process at a time.
+BATCH_SIZE = 500
+
+# The number of tokens between throughput reports.
+REPORT_INTERVAL = 100000
+
+# GitHub's OIDC Provider signs JWTs using RS256. Tokens using any other
+# algorithm (ex. 'none' or HS256) are rejected before a key is looked up.
+jwt = JsonWebToken(["RS256"])
+
+# Set in each worker process by `init_worker()`.
+_key_set = None
+_claims_options = None
+_now = None
 
 
 def decode(token_string: str) -> None:
@@ -36,6 +96,14 @@ def decode(token_string: str) -> None:
     print(signature)
 
 
+class UnknownKidError(JoseError):
+    """
+    Raised if no key in the JWKS matches the 'kid' header of a JWT.
+    """
+
+    error = "unknown_kid"
+
+
 def pad(s: str) -> str:
     """
     Pad a base64-encoded string such that its length is a multiple of 4.
@@ -68,5 +136,235 @@ def pad(s: str) -> str:
         return s
 
 
+def read_unverified(token_string: str) -> tuple[dict, dict]:
+    """
+    Read the header and payload of a JWT *without* verifying it.
+
+    :type token_string: str
+    :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+    :rtype: tuple[dict, dict]
+    :return: Header and payload of the JWT. Empty, if malformed.
+    """
+    parts = token_string.split(".")
+    decoded = []
+    for x in parts[:2]:
+        try:
+            value = json.loads(base64.urlsafe_b64decode(pad(x)))
+        except ValueError:
+            value = {}
+        decoded.append(value if isinstance(value, dict) else {})
+    decoded += [{}] * (2 - len(decoded))
+    return decoded[0], decoded[1]
+
+
+def init_worker(jwk_set: dict, issuer: Optional[str], now: Optional[int]) -> None:
+    """
+    Prepare a worker process for verifying JWTs.
+
+    The JWKS is imported once per worker process, rather than once per JWT.
+    """
+    global _key_set, _claims_options, _now
+    _key_set = JsonWebKey.import_key_set(jwk_set)
+    _claims_options = oidc.GitHubActionsOIDCTokenValidator(
+        public_key=None, issuer=issuer
+    ).claims_options
+    _now = now
+
+
+def load_key(header: dict, payload: dict):
+    """
+    Get the key in the JWKS matching the 'kid' header of a JWT.
+
+    :raises UnknownKidError: If no key in the JWKS matches.
+    """
+    try:
+        return _key_set.find_by_kid(header.get("kid"))
+    except ValueError:
+        raise UnknownKidError()
+
+
+def verify(token_string: str) -> dict:
+    """
+    Verify the signature and claims of a JWT.
+
+    Errors are recorded in the result, rather than raised, so that a single
+    malformed (or hostile) JWT never aborts a bulk verification.
+
+    :type token_string: str
+    :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+    :rtype: dict
+    :return: Verification result
+    """
+    header, payload = read_unverified(token_string)
+    result = {"valid": False, "error": None, "kid": header.get("kid")}
+    for claim in ("iss", "sub", "jti"):
+        result[claim] = payload.get(claim)
+    try:
+        claims = jwt.decode(token_string, load_key, claims_options=_claims_options)
+        claims.validate(now=_now)
+        result["valid"] = True
+    except JoseError as ex:
+        # NOTE: Some errors (ex. DecodeError) are raised with a message in
+        # place of the error code.
+        result["error"] = type(ex).error or ex.error
+    except Exception:
+        result["error"] = "verification_error"
+    return result
+
+
+def verify_batch(batch: list[tuple[int, Optional[str]]]) -> list[str]:
+    """
+    Verify a batch of JWTs. Runs in a worker process.
+
+    :type batch: list[tuple[int, Optional[str]]]
+    :param batch: List of (line number, JWT). The JWT is None, if the line
+      could not be parsed.
+
+    :rtype: list[str]
+    :return: Verification results, serialized as JSON.
+    """
+    results = []
+    for n, token_string in batch:
+        if token_string is None:
+            result = {"valid": False, "error": "invalid_line"}
+        else:
+            try:
+                result = verify(token_string)
+            except Exception:
+                # NOTE: `verify()` records errors in the result. This ensures
+                # an unexpected error never fails the batch (and the run).
+                result = {"valid": False, "error": "verification_error"}
+        results.append(json.dumps(dict(line=n, **result)))
+    return results
+
+
+def read_tokens(f: TextIO, field: str) -> Iterator[tuple[int, Optional[str]]]:
+    """
+    Read JWTs from a file, one per line. Lines may be JSON objects, in which
+    case the JWT is read from `field`. Empty lines are skipped. The JWT is
+    None, if the line is not valid JSON or `field` is missing (or not a
+    string).
+
+    :rtype: Iterator[tuple[int, Optional[str]]]
+    :return: Iterator of (line number, JWT).
+    """
+    for n, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                line = json.loads(line)[field]
+            except (KeyError, TypeError, ValueError):
+                line = None
+            if not isinstance(line, str):
+                line = None
+        yield n, line
+
+
+def load_jwk_set(jwks: Optional[str], issuer: str) -> dict:
+    """
+    Load a JWKS from a URL or a local snapshot (file). If not given, the JWKS
+    is fetched from the 'jwks_uri' of the issuer.
+    """
+    if jwks is None:
+        resp = requests.get(oidc.openid_configuration_uri(issuer), timeout=10)
+        resp.raise_for_status()
+        jwks = resp.json()["jwks_uri"]
+    if jwks.startswith(("http://", "https://")):
+        resp = requests.get(jwks, timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+    with open(jwks, "r") as f:
+        return json.load(f)
+
+
+def bulk_verify(
+    tokens: Iterable[tuple[int, Optional[str]]],
+    out: TextIO,
+    jwk_set: dict,
+    issuer: Optional[str] = None,
+    now: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> int:
+    """
+    Verify JWTs using a pool of worker processes and write the results to
+    `out` (JSONL) in input order.
+
+    At most 4 batches per worker process are in flight at a time, so memory
+    use does not grow with the number of JWTs.
+
+    :rtype: int
+    :return: Number of JWTs verified.
+    """
+    workers = workers or os.cpu_count()
+    tokens = iter(tokens)
+    batches = iter(lambda: list(itertools.islice(tokens, BATCH_SIZE)), [])
+    pending = collections.deque()
+    count, reported, start = 0, 0, time.monotonic()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(jwk_set, issuer, now),
+    ) as executor:
+        for batch in itertools.chain(batches, [None]):
+            if batch is not None:
+                pending.append(executor.submit(verify_batch, batch))
+            # Write results (in order) once the maximum number of batches are
+            # in flight or all batches have been submitted.
+            while pending and (batch is None or len(pending) >= workers * 4):
+                results = pending.popleft().result()
+                out.write("\n".join(results) + "\n")
+                count += len(results)
+                if count - reported >= REPORT_INTERVAL:
+                    report(count, start)
+                    reported = count
+    out.flush()
+    report(count, start)
+    return count
+
+
+def report(count: int, start: float) -> None:
+    """
+    Report throughput to standard error.
+    """
+    elapsed = time.monotonic() - start
+    rate = count / elapsed if elapsed else 0
+    print(
+        f"Verified {count} tokens in {elapsed:.1f}s ({rate:.0f} tokens/s)",
+        file=sys.stderr,
+    )
+
+
+def main(argv: list[str]) -> None:
+    """
+    Verify JWTs in bulk. See: module docstring.
+    """
+    parser = argparse.ArgumentParser(prog="decode.py verify")
+    parser.add_argument("file", nargs="?", help="defaults to standard input")
+    parser.add_argument("--jwks", help="JWKS URL or file (snapshot)")
+    parser.add_argument("--issuer", default=oidc.GITHUB_OPENID_ISSUER_URI)
+    parser.add_argument("--workers", type=int, help="defaults to CPU count")
+    parser.add_argument("--now", type=int, help="time to verify 'exp' against")
+    parser.add_argument("--field", default="token", help="JSONL token field")
+    args = parser.parse_args(argv)
+    jwk_set = load_jwk_set(args.jwks, args.issuer)
+    f = open(args.file, "r") if args.file else sys.stdin
+    with f:
+        bulk_verify(
+            tokens=read_tokens(f, args.field),
+            out=sys.stdout,
+            jwk_set=jwk_set,
+            issuer=args.issuer,
+            now=args.now,
+            workers=args.workers,
+        )
+
+
 if __name__ == "__main__":
-    decode(sys.argv[1])
+    if sys.argv[1:2] == ["verify"]:
+        main(sys.argv[2:])
+    else:
+        decode(sys.argv[1])
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Load test the OIDC protected '/v1/auth' endpoint.
+
+Starts a local OpenID Provider (serving discovery metadata and a JWKS) and the
+Flask application using the given server, then sends requests with a JWT
+signed by the local OpenID Provider from concurrent clients.
+
+Usage:
+
+  $ python scripts/loadtest.py --server dev
+  $ python scripts/loadtest.py --server gunicorn --requests 5000 --concurrency 32
+
+Servers:
+  * dev: Werkzeug development server (flask --app src/app.py run).
+  * gunicorn: Gunicorn (gunicorn src.wsgi:app). See: gunicorn.conf.py.
+
+Side Effect: Outputs throughput and latency percentiles to standard output.
+"""
+import argparse
+import http.server
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from authlib.jose import JsonWebKey, jwt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+
+from src.claims import CLAIMS  # noqa: E402
+
+
+def free_port() -> int:
+    """
+    Find a free TCP port on localhost.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_issuer(private_key) -> str:
+    """
+    Start a local OpenID Provider in a background thread.
+
+    :rtype: str
+    :return: Issuer URI
+    """
+    port = free_port()
+    issuer = f"http://127.0.0.1:{port}"
+    documents = {
+        "/.well-known/openid-configuration": {
+            "issuer": issuer,
+            "jwks_uri": f"{issuer}/.well-known/jwks",
+        },
+        "/.well-known/jwks": {"keys": [private_key.as_dict(is_private=False)]},
+    }
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(documents.get(self.path, {})).encode()
+            self.send_response(200 if self.path in documents else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return issuer
+
+
+def generate_jwt(private_key, issuer: str) -> str:
+    """
+    Generate a JWT with all essential claims, valid for an hour.
+    """
+    now = int(time.time())
+    payload = {name: name for name in CLAIMS}
+    payload.update(
+        iss=issuer,
+        iat=now,
+        nbf=now,
+        exp=now + 3600,
+        ref="refs/heads/master",
+        repository="nickolashkraus/flask-oidc",
+    )
+    header = {"alg": "RS256", "typ": "JWT", "kid": private_key.kid}
+    return jwt.encode(header, payload, private_key).decode()
+
+
+def start_server(server: str, port: int, issuer: str) -> subprocess.Popen:
+    """
+    Start the Flask application using the given server.
+    """
+    env = dict(
+        os.environ,
+        FLASK_OIDC_ISSUERS=json.dumps([issuer]),
+        GUNICORN_ACCESSLOG="",
+    )
+    if server == "dev":
+        cmd = ["flask", "--app", "src/app.py", "run", "--port", str(port)]
+    else:
+        cmd = ["gunicorn", "--bind", f"127.0.0.1:{port}", "src.wsgi:app"]
+    proc = subprocess.Popen(
+        [sys.executable, "-m"] + cmd,
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/v1/"
+    for _ in range(100):
+        try:
+            requests.get(url, timeout=1)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"Server did not start: {server}")
+
+
+def run(url: str, token: str, n: int, concurrency: int) -> dict:
+    """
+    Send `n` requests from `concurrency` concurrent clients.
+
+    Each client reuses its connection (keep-alive), if the server allows it.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def client(count: int) -> list[float]:
+        latencies = []
+        with requests.Session() as session:
+            for _ in range(count):
+                start = time.perf_counter()
+                resp = session.get(url, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"Unexpected status: {resp.status_code}")
+        return latencies
+
+    counts = [n // concurrency + (i < n % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(x for xs in executor.map(client, counts) for x in xs)
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": n,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(n / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--server", choices=["dev", "gunicorn"], default="gunicorn")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    private_key = JsonWebKey.generate_key("RSA", 2048, {"kid": "1"}, is_private=True)
+    issuer = start_issuer(private_key)
+    port = free_port()
+    proc = start_server(args.server, port, issuer)
+    try:
+        url = f"http://127.0.0.1:{port}/v1/auth"
+        token = generate_jwt(private_key, issuer)
+        # Warm up (fetch discovery metadata and JWKS).
+        run(url, token, args.concurrency, args.concurrency)
+        result = run(url, token, args.requests, args.concurrency)
+        print(json.dumps(dict(server=args.server, **result)))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Stress test OIDC token verification during key rotation.
+
+Starts a local OpenID Provider that rotates its signing key on a schedule,
+then verifies JWTs from many concurrent threads using either the validator
+(`GitHubActionsOIDCTokenValidator` with a `JWKSCache`) or the OIDC protected
+'/v1/auth' endpoint (Flask test client, cache of verified OIDC tokens
+disabled).
+
+Rotation (every --rotate-interval seconds):
+
+  1. A new key is published in the JWKS and immediately used to sign new
+     JWTs. This is the worst case: JWTs signed by the new key arrive before
+     any JWKS cache has been refreshed.
+  2. The previous key remains published for --overlap seconds (the overlap
+     window), then is retired. During the overlap window, a fraction
+     (--previous) of requests present a JWT signed by a previous key.
+
+Checks (the exit status is 1, if any check fails):
+
+  * No false rejections: Every JWT signed by a key that was published for the
+    whole duration of the request is accepted.
+  * Bounded upstream fetches: The JWKS is fetched at most once at startup,
+    once per rotation, and once per --ttl seconds, no matter the number of
+    threads. The discovery metadata is fetched at most once.
+
+Usage:
+
+  $ python scripts/stress.py
+  $ python scripts/stress.py --mode app --threads 32 --duration 30
+
+NOTE: Key rotations must be at least --min-refresh-interval seconds apart.
+Otherwise, JWTs signed by a new key are rejected (by design) until the JWKS
+may be fetched again.
+
+Side Effect: Outputs throughput, latency percentiles (overall and in the
+second following each rotation), and upstream fetches to standard output.
+"""
+import argparse
+import collections
+import http.server
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from authlib.jose import JsonWebKey
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.loadtest import free_port, generate_jwt  # noqa: E402
+from src import app, oidc  # noqa: E402
+
+
+class RotatingIssuer(object):
+    """
+    Local OpenID Provider rotating its signing key on a schedule.
+    """
+
+    def __init__(self, rotate_interval: float, overlap: float, rotations: int) -> None:
+        """
+        Create a new `RotatingIssuer` object.
+
+        :type rotate_interval: float
+        :param rotate_interval: Number of seconds between key rotations.
+        :type overlap: float
+        :param overlap: Number of seconds a previous key remains published.
+        :type rotations: int
+        :param rotations: Number of key rotations.
+
+        :rtype: None
+        :return: None
+        """
+        self.rotate_interval = rotate_interval
+        self.overlap = overlap
+        # Generate keys ahead of time, since generating a key is CPU-bound.
+        self.keys = [
+            JsonWebKey.generate_key("RSA", 2048, {"kid": str(i)}, is_private=True)
+            for i in range(rotations + 1)
+        ]
+        self.issuer = f"http://127.0.0.1:{free_port()}"
+        # Mapping of 'kid' to [published_at, retired_at] (monotonic time).
+        self.published = {}
+        # Mapping of 'kid' to a JWT signed by the key.
+        self.tokens = {}
+        self.current = None
+        self.rotated_at = []
+        self.fetches = collections.Counter()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Start serving discovery metadata and the JWKS, and start rotating keys
+        in background threads.
+        """
+        issuer = self.issuer
+        documents = {
+            "/.well-known/openid-configuration": lambda: {
+                "issuer": issuer,
+                "jwks_uri": f"{issuer}/.well-known/jwks",
+            },
+            "/.well-known/jwks": self.jwk_set,
+        }
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(handler):
+                document = documents.get(handler.path)
+                with self._lock:
+                    self.fetches[handler.path] += 1
+                body = json.dumps(document() if document else {}).encode()
+                handler.send_response(200 if document else 404)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        port = int(issuer.rsplit(":", 1)[1])
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self._publish(self.keys[0])
+        threading.Thread(target=self._rotate, daemon=True).start()
+
+    def _rotate(self) -> None:
+        start = time.monotonic()
+        for i, key in enumerate(self.keys[1:], 1):
+            time.sleep(max(0, start + i * self.rotate_interval - time.monotonic()))
+            previous = self.current
+            self._publish(key)
+            threading.Timer(self.overlap, self._retire, args=(previous,)).start()
+
+    def _publish(self, key) -> None:
+        token = generate_jwt(key, self.issuer)
+        with self._lock:
+            now = time.monotonic()
+            self.published[key.kid] = [now, None]
+            self.tokens[key.kid] = token
+            self.current = key.kid
+            self.rotated_at.append(now)
+
+    def _retire(self, kid: str) -> None:
+        with self._lock:
+            self.published[kid][1] = time.monotonic()
+
+    def jwk_set(self) -> dict:
+        """
+        Get the JWKS (published keys).
+        """
+        with self._lock:
+            return {
+                "keys": [
+                    key.as_dict(is_private=False)
+                    for key in self.keys
+                    if key.kid in self.published and self.published[key.kid][1] is None
+                ]
+            }
+
+    def token(self, rng: random.Random, previous: float) -> tuple[str, str]:
+        """
+        Get a JWT signed by the current key or, with probability `previous`, a
+        previous key that is still published.
+
+        :rtype: tuple[str, str]
+        :return: 'kid' of the signing key and the JWT.
+        """
+        with self._lock:
+            kid = self.current
+            if rng.random() < previous:
+                kids = [
+                    k for k, (_, retired_at) in self.published.items() if not retired_at
+                ]
+                kid = rng.choice(kids)
+            return kid, self.tokens[kid]
+
+    def was_published(self, kid: str, start: float, end: float) -> bool:
+        """
+        Whether the key was published from `start` to `end` (monotonic time).
+        """
+        with self._lock:
+            published_at, retired_at = self.published[kid]
+        return published_at <= start and (retired_at is None or retired_at > end)
+
+
+def validator_client(issuer: RotatingIssuer, args: argparse.Namespace):
+    """
+    Create a client verifying JWTs using the validator.
+    """
+    jwks_uri = f"{issuer.issuer}/.well-known/jwks"
+    validator = oidc.GitHubActionsOIDCTokenValidator(
+        public_key=oidc.JWKSCache(
+            fetch_jwk_set=lambda: requests.get(jwks_uri, timeout=5).json(),
+            ttl=args.ttl,
+            min_refresh_interval=args.min_refresh_interval,
+        ),
+        issuer=issuer.issuer,
+    )
+    return lambda: lambda token: validator.verify_token(token) is not None
+
+
+def app_client(issuer: RotatingIssuer, args: argparse.Namespace):
+    """
+    Create a client verifying JWTs using the '/v1/auth' endpoint.
+    """
+    flask_app = app.create_app(
+        {
+            "OIDC_ISSUERS": [issuer.issuer],
+            "OIDC_JWKS_TTL": args.ttl,
+            "OIDC_CACHE_MAX_ENTRIES": 0,
+        }
+    )
+    validator = flask_app.extensions["oidc_validator"].validators[issuer.issuer]
+    validator.public_key.min_refresh_interval = args.min_refresh_interval
+
+    def new_client():
+        client = flask_app.test_client()
+        return (
+            lambda token: client.get(
+                "/v1/auth", headers={"Authorization": f"Bearer {token}"}
+            ).status_code
+            == 200
+        )
+
+    return new_client
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    """
+    Get the `p`th percentile of sorted latencies in milliseconds.
+    """
+    if not latencies:
+        return 0.0
+    return round(latencies[max(0, math.ceil(len(latencies) * p) - 1)] * 1000, 2)
+
+
+def run(mode: str, args: argparse.Namespace) -> dict:
+    """
+    Verify JWTs from `args.threads` threads for `args.duration` seconds while
+    the OpenID Provider rotates its signing key.
+    """
+    rotations = int(args.duration // args.rotate_interval)
+    issuer = RotatingIssuer(args.rotate_interval, args.overlap, rotations)
+    new_client = {"validator": validator_client, "app": app_client}[mode](issuer, args)
+    issuer.start()
+    deadline = time.monotonic() + args.duration
+
+    def client(seed: int) -> list[tuple[float, float, str, bool]]:
+        verify, rng, results = new_client(), random.Random(seed), []
+        while time.monotonic() < deadline:
+            kid, token = issuer.token(rng, args.previous)
+            start = time.monotonic()
+            valid = verify(token)
+            end = time.monotonic()
+            results.append((start, end, kid, valid))
+        return results
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = [x for xs in executor.map(client, range(args.threads)) for x in xs]
+    elapsed = time.monotonic() - start
+    false_rejections = sum(
+        1
+        for start, end, kid, valid in results
+        if not valid and issuer.was_published(kid, start, end)
+    )
+    latencies = sorted(end - start for start, end, _, _ in results)
+    # Latency in the second following each rotation.
+    rotated_at = issuer.rotated_at[1:]
+    rotation_latencies = sorted(
+        end - start
+        for start, end, _, _ in results
+        if any(0 <= start - t < 1 for t in rotated_at)
+    )
+    jwks_fetches = issuer.fetches["/.well-known/jwks"]
+    discovery_fetches = issuer.fetches["/.well-known/openid-configuration"]
+    max_jwks_fetches = 1 + rotations + math.ceil(args.duration / args.ttl)
+    return {
+        "mode": mode,
+        "threads": args.threads,
+        "seconds": round(elapsed, 2),
+        "requests": len(results),
+        "requests_per_second": round(len(results) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": percentile(latencies, 0.99),
+        "p999_ms": percentile(latencies, 0.999),
+        "max_ms": percentile(latencies, 1),
+        "rotations": len(rotated_at),
+        "rotation_p99_ms": percentile(rotation_latencies, 0.99),
+        "rotation_max_ms": percentile(rotation_latencies, 1),
+        "false_rejections": false_rejections,
+        "jwks_fetches": jwks_fetches,
+        "max_jwks_fetches": max_jwks_fetches,
+        "discovery_fetches": discovery_fetches,
+        "ok": (
+            false_rejections == 0
+            and jwks_fetches <= max_jwks_fetches
+            and discovery_fetches <= 1
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--mode", choices=["validator", "app"], action="append", dest="modes"
+    )
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--rotate-interval", type=float, default=2)
+    parser.add_argument("--overlap", type=float, default=3)
+    parser.add_argument("--previous", type=float, default=0.2)
+    parser.add_argument("--ttl", type=float, default=5)
+    parser.add_argument("--min-refresh-interval", type=float, default=1)
+    args = parser.parse_args()
+    if args.rotate_interval <= args.min_refresh_interval:
+        parser.error("--rotate-interval must exceed --min-refresh-interval")
+    # The application logs every request at the DEBUG level.
+    logging.getLogger().setLevel(logging.WARNING)
+    ok = True
+    for mode in args.modes or ["validator", "app"]:
+        result = run(mode, args)
+        print(json.dumps(result))
+        ok = ok and result["ok"]
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,69 @@
 """
 Flask application setup and routes.
 """
+import functools
+import hashlib
+import json
 import logging
+import math
 import os
+import time
+from string import Template
+from typing import Optional
 
 import boto3
 import requests
 from authlib.integrations.flask_client import OAuth
 from authlib.integrations.flask_oauth2 import ResourceProtector
 from botocore.exceptions import ClientError
-from flask import Blueprint, Flask, Response, jsonify, request
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request
 
-from src import oidc
+from src import audit, oidc, ratelimit, sts
+from src.cache import ExpiringCache
 
 # The number of seconds the presigned POST request is valid.
 EXPIRES_IN = 3600
 
+# The number of seconds to wait for an OpenID Provider to respond.
+OIDC_HTTP_TIMEOUT = 5
+
+# The maximum number of cached claims of valid OIDC tokens.
+OIDC_CACHE_MAX_ENTRIES = 4096
+
+# The maximum number of OIDC tokens per batch verification request.
+VERIFY_BATCH_MAX_TOKENS = 100
+
+# Claims returned as headers (X-Actions-<Claim>) by the external authorization
+# endpoint.
+VERIFY_CLAIM_HEADERS = [
+    "sub",
+    "repository",
+    "repository_owner",
+    "actor",
+    "ref",
+    "workflow",
+    "run_id",
+]
+
+# HTTP methods accepted by the external authorization endpoint. Gateways
+# forward the method of the original request.
+EXT_AUTHZ_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+
+# The maximum number of seconds since the JWKS of an OpenID Provider was
+# fetched for the application to be ready to serve requests. While the OpenID
+# Provider is unavailable, stale keys continue to be used up to this age.
+READY_MAX_JWKS_AGE = 3600
+
+# The maximum number of cached AWS credentials.
+STS_CACHE_MAX_ENTRIES = 1024
+
+# The fraction of the lifetime (EXPIRES_IN) a cached presigned POST request
+# must have left in order to be returned.
+PRESIGNED_CACHE_MIN_REMAINING = 0.5
+
+# The maximum number of cached presigned POST requests.
+PRESIGNED_CACHE_MAX_ENTRIES = 1024
+
 # App setup
 #
 # NOTE: All code at level 0 indentation is executed when:
@@ -27,6 +75,9 @@ logging.basicConfig(level=logging.DEBUG)
 # See: https://flask.palletsprojects.com/en/2.2.x/tutorial/views/
 v1 = Blueprint("v1", __name__, url_prefix="/v1")
 
+# Health and readiness endpoints for orchestrators (ex. Kubernetes probes).
+probes = Blueprint("probes", __name__)
+
 # Flask decorator to require OIDC. Ensures only clients with a valid OIDC token
 # can access the protected API endpoint.
 #
@@ -40,30 +91,220 @@ v1 = Blueprint("v1", __name__, url_prefix="/v1")
 require_oidc = ResourceProtector()
 
 
+def rate_limited(f):
+    """
+    Flask decorator to limit the rate of requests per caller. Must be applied
+    after 'require_oidc', since callers are identified by the claims of their
+    OIDC token.
+
+    Requests exceeding a limit (see: 'RATE_LIMITS') are rejected with:
+
+      429 Too Many Requests
+      Retry-After: <seconds>
+
+    Example:
+
+      @v1.route("/presigned")
+      @require_oidc()
+      @rate_limited
+      def presigned():
+          ...
+    """
+
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        limiter = current_app.extensions["rate_limiter"]
+        if limiter is not None:
+            exceeded = limiter.acquire(g.actions_claims)
+            if exceeded is not None:
+                claim, retry_after = exceeded
+                resp = jsonify(
+                    message=f"Too Many Requests: Rate limit exceeded for "
+                    f"'{claim}': {g.actions_claims.get(claim)}"
+                )
+                resp.status_code = 429
+                resp.headers["Retry-After"] = str(math.ceil(retry_after))
+                return resp
+        return f(*args, **kwargs)
+
+    return decorated
+
+
 # See: https://flask.palletsprojects.com/en/2.2.x/patterns/appfactories/
 #
 # Flask will automatically detect the factory if it is named create_app or
 # make_app.
-def create_app():
+def create_app(test_config: dict = None) -> Flask:
     """
     Flask app factory.
-    """
+
+    Configuration is loaded from environment variables prefixed with 'FLASK_'
+    (ex. FLASK_OIDC_ISSUERS). Values are parsed as JSON, if possible.
+
+    See: https://flask.palletsprojects.com/en/2.2.x/config/#configuring-from-environment-variables
+
+    Configuration:
+
+      OIDC_ISSUERS: List of trusted OpenID Provider issuers. Each issuer is
+        either an issuer URI or a dictionary with the following keys:
+          * issuer: OpenID Provider issuer URI.
+          * jwks_ttl: Number of seconds the JWKS of the OpenID Provider is
+            considered fresh. Defaults to OIDC_JWKS_TTL.
+
+        Example:
+
+          FLASK_OIDC_ISSUERS='[
+            "https://token.actions.githubusercontent.com",
+            {"issuer": "https://github.example.com/_services/token", "jwks_ttl": 60}
+          ]'
+
+      OIDC_JWKS_TTL: Default number of seconds the JWKS of an OpenID Provider
+        is considered fresh.
+      OIDC_HTTP_TIMEOUT: Number of seconds to wait for an OpenID Provider to
+        respond.
+      OIDC_FAST_VERIFY: Whether to verify RS256 OIDC tokens directly using the
+        'cryptography' library, rather than authlib. Disabled by default.
+        See: `oidc.GitHubActionsOIDCTokenValidator.verify_rs256()`.
+      OIDC_CACHE_MAX_ENTRIES: Maximum number of cached claims of valid OIDC
+        tokens. Set to 0 to disable caching.
+      READY_MAX_JWKS_AGE: Maximum number of seconds since the JWKS of each
+        OpenID Provider was fetched for the 'readyz' endpoint to report ready.
+      VERIFY_BATCH_MAX_TOKENS: Maximum number of OIDC tokens per request to the
+        'verify_batch' endpoint.
+      VERIFY_CLAIM_HEADERS: Claims returned as headers by the 'ext_authz'
+        endpoint.
+      STS_ROLE_POLICY: Ordered list of rules for selecting the IAM role to
+        assume for an OIDC token. See: `sts.select_role()`.
+      STS_EXPIRY_MARGIN: Number of seconds before expiry at which cached AWS
+        credentials are no longer vended.
+      STS_CACHE_MAX_ENTRIES: Maximum number of cached AWS credentials.
+      PRESIGNED_CACHE_ENABLED: Whether to cache presigned POST requests.
+      PRESIGNED_CACHE_MIN_REMAINING: Fraction of the lifetime (EXPIRES_IN) a
+        cached presigned POST request must have left in order to be returned.
+      PRESIGNED_CACHE_MAX_ENTRIES: Maximum number of cached presigned POST
+        requests.
+      RATE_LIMITS: List of rate limits (and quotas) per caller. See:
+        src/ratelimit.py.
+      RATE_LIMIT_REDIS_URL: Redis URL for sharing rate limits between workers.
+        Rate limits are kept in memory (per process), if not set.
+      AUDIT_URL: Sink for the audit trail of authenticated requests and
+        presigned POST requests (ex. file:///var/log/flask-oidc/audit or
+        s3://bucket/prefix/). See: src/audit.py. Disabled, if not set.
+      AUDIT_QUEUE_MAX_RECORDS: Maximum number of queued audit records.
+      AUDIT_SEGMENT_MAX_RECORDS: Maximum number of audit records per segment.
+      AUDIT_FLUSH_INTERVAL: Maximum number of seconds an audit record is
+        queued before it is written.
+      AUDIT_OVERFLOW: Overflow policy ('drop' or 'block'), if the audit queue
+        is full.
+      AUDIT_BLOCK_TIMEOUT: Maximum number of seconds a request waits for space
+        in the audit queue ('block' overflow policy only).
+
+    :type test_config: dict
+    :param test_config: Configuration overriding the default and environment
+      configuration.
+
+    :rtype: Flask
+    :return: Flask application
+    """  # noqa
     app = Flask(__name__)
+    app.config.from_mapping(
+        OIDC_ISSUERS=[oidc.GITHUB_OPENID_ISSUER_URI],
+        OIDC_JWKS_TTL=oidc.JWKS_TTL,
+        OIDC_HTTP_TIMEOUT=OIDC_HTTP_TIMEOUT,
+        OIDC_FAST_VERIFY=False,
+        OIDC_CACHE_MAX_ENTRIES=OIDC_CACHE_MAX_ENTRIES,
+        READY_MAX_JWKS_AGE=READY_MAX_JWKS_AGE,
+        VERIFY_BATCH_MAX_TOKENS=VERIFY_BATCH_MAX_TOKENS,
+        VERIFY_CLAIM_HEADERS=VERIFY_CLAIM_HEADERS,
+        STS_ROLE_POLICY=[],
+        STS_EXPIRY_MARGIN=sts.EXPIRY_MARGIN,
+        STS_CACHE_MAX_ENTRIES=STS_CACHE_MAX_ENTRIES,
+        PRESIGNED_CACHE_ENABLED=False,
+        PRESIGNED_CACHE_MIN_REMAINING=PRESIGNED_CACHE_MIN_REMAINING,
+        PRESIGNED_CACHE_MAX_ENTRIES=PRESIGNED_CACHE_MAX_ENTRIES,
+        RATE_LIMITS=[],
+        RATE_LIMIT_REDIS_URL=None,
+        AUDIT_URL=None,
+        AUDIT_QUEUE_MAX_RECORDS=audit.QUEUE_MAX_RECORDS,
+        AUDIT_SEGMENT_MAX_RECORDS=audit.SEGMENT_MAX_RECORDS,
+        AUDIT_FLUSH_INTERVAL=audit.FLUSH_INTERVAL,
+        AUDIT_OVERFLOW=audit.DROP,
+        AUDIT_BLOCK_TIMEOUT=audit.BLOCK_TIMEOUT,
+    )
+    app.config.from_prefixed_env()
+    if test_config:
+        app.config.from_mapping(test_config)
     app.register_blueprint(v1)
+    app.register_blueprint(probes)
     # Configure OAuth (OIDC)
     #
     # NOTE: OpenID Connect 1.0 is a identity layer on top of the OAuth 2.0
     # protocol.
     oauth = OAuth(app)
-    oauth.register(
-        name="github", server_metadata_url=oidc.GITHUB_OPENID_CONFIGURATION_URI
-    )
+    # Configure a validator (and JWKS cache) for each trusted issuer.
+    validators = {}
+    for options in app.config["OIDC_ISSUERS"]:
+        if isinstance(options, str):
+            options = {"issuer": options}
+        issuer = options["issuer"]
+        client = oauth.register(
+            name=issuer,
+            server_metadata_url=oidc.openid_configuration_uri(issuer),
+            client_kwargs={"default_timeout": app.config["OIDC_HTTP_TIMEOUT"]},
+        )
+        validators[issuer] = oidc.GitHubActionsOIDCTokenValidator(
+            public_key=oidc.fetch_github_oidc_public_key(
+                client, ttl=options.get("jwks_ttl", app.config["OIDC_JWKS_TTL"])
+            ),
+            issuer=issuer,
+            fast_verify=app.config["OIDC_FAST_VERIFY"],
+        )
+    # Configure (optional) audit trail.
+    audit_log = None
+    if app.config["AUDIT_URL"]:
+        audit_log = audit.AuditLog(
+            sink=audit.sink_from_url(app.config["AUDIT_URL"]),
+            queue_max_records=app.config["AUDIT_QUEUE_MAX_RECORDS"],
+            segment_max_records=app.config["AUDIT_SEGMENT_MAX_RECORDS"],
+            flush_interval=app.config["AUDIT_FLUSH_INTERVAL"],
+            overflow=app.config["AUDIT_OVERFLOW"],
+            block_timeout=app.config["AUDIT_BLOCK_TIMEOUT"],
+        )
+    app.extensions["audit"] = audit_log
     # Configure and register 'require_oidc' Flask decorator.
-    oidc_token_validator = oidc.GitHubActionsOIDCTokenValidator(
-        public_key=oidc.fetch_github_oidc_public_key(oauth.github),
-        issuer=oidc.GITHUB_OPENID_ISSUER_URI,
+    oidc_token_validator = oidc.MultiIssuerOIDCTokenValidator(
+        validators,
+        cache=(
+            ExpiringCache(max_entries=app.config["OIDC_CACHE_MAX_ENTRIES"])
+            if app.config["OIDC_CACHE_MAX_ENTRIES"]
+            else None
+        ),
+        audit=audit_log,
     )
     require_oidc.register_token_validator(oidc_token_validator)
+    # The validator is shared by 'require_oidc' and the verification API.
+    app.extensions["oidc_validator"] = oidc_token_validator
+    # Configure cache for AWS credentials vended by the 'credentials' endpoint.
+    app.extensions["sts_credentials"] = ExpiringCache(
+        max_entries=app.config["STS_CACHE_MAX_ENTRIES"]
+    )
+    # Configure (optional) cache for presigned POST requests generated by the
+    # 'presigned' endpoint.
+    app.extensions["presigned_posts"] = (
+        ExpiringCache(max_entries=app.config["PRESIGNED_CACHE_MAX_ENTRIES"])
+        if app.config["PRESIGNED_CACHE_ENABLED"]
+        else None
+    )
+    # Configure (optional) rate limiter for protected API endpoints.
+    rate_limiter = None
+    if app.config["RATE_LIMITS"]:
+        backend = None
+        if app.config["RATE_LIMIT_REDIS_URL"]:
+            backend = ratelimit.RedisBackend.from_url(
+                app.config["RATE_LIMIT_REDIS_URL"]
+            )
+        rate_limiter = ratelimit.RateLimiter(app.config["RATE_LIMITS"], backend)
+    app.extensions["rate_limiter"] = rate_limiter
     return app
 
 
@@ -90,6 +331,7 @@ def auth():
 
 @v1.route("/presigned", methods=["POST"])
 @require_oidc()
+@rate_limited
 def presigned() -> Response:
     """
     An endpoint protected using OIDC authentication for generating a presigned
@@ -117,13 +359,25 @@ def presigned() -> Response:
       $ http POST http://127.0.0.1:5000/v1/presigned?demo=true \
         bucket=flask-oidc key=demo.txt
 
+    If 'PRESIGNED_CACHE_ENABLED' is set, presigned POST requests are cached
+    per (caller, bucket, key, tagging). Retries and parallel steps receive the
+    cached presigned POST request while it has at least
+    'PRESIGNED_CACHE_MIN_REMAINING' of its lifetime left. The response
+    includes the following headers:
+
+      X-Cache: HIT | MISS
+      Age: <seconds since the presigned POST request was generated>
+
+    If 'AUDIT_URL' is set, each presigned POST request returned is recorded in
+    the audit trail with the claims of the OIDC token. See: src/audit.py.
+
     :rtype: flask.Response
     :return: Response object to return
     """  # noqa
     # TODO: Use case insensitive dict.
     data = request.get_json()
     bucket, key = data.get("bucket"), data.get("key")
-    if not (bucket or key):
+    if not (bucket and key):
         resp = jsonify(
             message="Bad Request: S3 bucket and/or key not provided in request"
         )
@@ -131,8 +385,22 @@ def presigned() -> Response:
         return resp
     try:
         tagging = {"Key1": "Value1", "Key2": "Value2", "Foo": "Bar", "RETAIN_1": ""}
-        resp = jsonify(generate_presigned_post(bucket=bucket, key=key, tagging=tagging))
+        cache = current_app.extensions["presigned_posts"]
+        if cache is None:
+            resp = jsonify(
+                generate_presigned_post(bucket=bucket, key=key, tagging=tagging)
+            )
+        else:
+            presigned_post, age = generate_cached_presigned_post(
+                cache=cache, bucket=bucket, key=key, tagging=tagging
+            )
+            resp = jsonify(presigned_post)
+            resp.headers["X-Cache"] = "MISS" if age is None else "HIT"
+            resp.headers["Age"] = str(age or 0)
         resp.status_code = 200
+        audit_log = current_app.extensions["audit"]
+        if audit_log is not None:
+            audit_log.record("presigned", g.actions_claims, bucket=bucket, key=key)
     except ClientError as ex:
         resp = jsonify(
             message=f"Internal Server Error: An error occurred generating the "
@@ -162,6 +430,329 @@ def presigned() -> Response:
     return resp
 
 
+@v1.route("/credentials", methods=["POST"])
+@require_oidc()
+@rate_limited
+def credentials() -> Response:
+    """
+    An endpoint protected using OIDC authentication for vending short-lived
+    AWS credentials.
+
+    The IAM role is selected by the 'STS_ROLE_POLICY' from the claims of the
+    OIDC token. Credentials are cached, so that retries (and, in 'assume_role'
+    mode, jobs in the same workflow run) share credentials. See: src/sts.py.
+
+    API Reference:
+
+      POST /credentials
+
+    Example:
+
+      $ http POST http://127.0.0.1:5000/v1/credentials \
+        "Authorization: Bearer ${OIDC_TOKEN}"
+
+      {
+        "Version": 1,
+        "AccessKeyId": "...",
+        "SecretAccessKey": "...",
+        "SessionToken": "...",
+        "Expiration": "2023-01-23T18:00:00+00:00"
+      }
+
+    :rtype: flask.Response
+    :return: Response object to return
+    """
+    claims = g.actions_claims
+    rule = sts.select_role(current_app.config["STS_ROLE_POLICY"], claims)
+    if rule is None:
+        resp = jsonify(message="Forbidden: No IAM role permitted for OIDC token")
+        resp.status_code = 403
+        return resp
+    # NOTE: The Authorization header has already been validated by
+    # 'require_oidc' (Authorization: Bearer xxxxx.yyyyy.zzzzz).
+    token_string = read_bearer_token()
+    try:
+        creds, _ = sts.vend_credentials(
+            cache=current_app.extensions["sts_credentials"],
+            rule=rule,
+            claims=claims,
+            token_string=token_string,
+            expiry_margin=current_app.config["STS_EXPIRY_MARGIN"],
+        )
+    except ClientError as ex:
+        resp = jsonify(
+            message=f"Internal Server Error: An error occurred assuming the IAM "
+            f"role:\nError: {ex}\n"
+        )
+        resp.status_code = 500
+        return resp
+    resp = jsonify(creds)
+    resp.status_code = 200
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@v1.route("/verify", methods=["POST"])
+def verify() -> Response:
+    """
+    An endpoint for verifying an OIDC token on behalf of another service.
+
+    Verification shares the JWKS cache and the cache of verified OIDC tokens
+    with 'require_oidc', so verdicts for recently seen OIDC tokens do not
+    require signature verification or requests to the OpenID Provider.
+
+    API Reference:
+
+      POST /verify
+      Content-Type: application/json
+
+      {
+        "token": <token>
+      }
+
+    Response:
+
+      {
+        "valid": true,
+        "claims": {"sub": ..., "repository": ..., ...}
+      }
+
+    :rtype: flask.Response
+    :return: Response object to return
+    """
+    data = request.get_json(silent=True)
+    # NOTE: The body may be any JSON value (ex. a list), not only an object.
+    token_string = data.get("token") if isinstance(data, dict) else None
+    if not isinstance(token_string, str):
+        resp = jsonify(message="Bad Request: OIDC token not provided in request")
+        resp.status_code = 400
+        return resp
+    resp = jsonify(verify_token(token_string))
+    resp.status_code = 200
+    return resp
+
+
+@v1.route("/verify/batch", methods=["POST"])
+def verify_batch() -> Response:
+    """
+    An endpoint for verifying multiple OIDC tokens on behalf of another
+    service. See: `verify()`.
+
+    API Reference:
+
+      POST /verify/batch
+      Content-Type: application/json
+
+      {
+        "tokens": [<token>, ...]
+      }
+
+    Response (in the order of the request):
+
+      {
+        "results": [{"valid": true, "claims": {...}}, {"valid": false}, ...]
+      }
+
+    :rtype: flask.Response
+    :return: Response object to return
+    """
+    data = request.get_json(silent=True)
+    tokens = data.get("tokens") if isinstance(data, dict) else None
+    if not (isinstance(tokens, list) and all(isinstance(x, str) for x in tokens)):
+        resp = jsonify(message="Bad Request: OIDC tokens not provided in request")
+        resp.status_code = 400
+        return resp
+    max_tokens = current_app.config["VERIFY_BATCH_MAX_TOKENS"]
+    if len(tokens) > max_tokens:
+        resp = jsonify(
+            message=f"Bad Request: Too many OIDC tokens in request (max: {max_tokens})"
+        )
+        resp.status_code = 400
+        return resp
+    resp = jsonify(results=[verify_token(x) for x in tokens])
+    resp.status_code = 200
+    return resp
+
+
+@v1.route("/ext_authz", defaults={"path": ""}, methods=EXT_AUTHZ_METHODS)
+@v1.route("/ext_authz/<path:path>", methods=EXT_AUTHZ_METHODS)
+def ext_authz(path: str) -> Response:
+    """
+    An external authorization endpoint for gateways and proxies (ex. Envoy
+    'ext_authz' or NGINX 'auth_request').
+
+    The gateway forwards the headers of the original request. If the request
+    contains a valid OIDC token, the response is '200 OK' with the claims
+    configured by 'VERIFY_CLAIM_HEADERS' as headers, which the gateway can
+    forward to the upstream service:
+
+      X-Actions-Sub: repo:nickolashkraus/flask-oidc:ref:refs/heads/master
+      X-Actions-Repository: nickolashkraus/flask-oidc
+      ...
+
+    Otherwise, the response is '401 UNAUTHORIZED'.
+
+    The original request path may be appended to the endpoint (ex.
+    /ext_authz/original/path) and is ignored.
+
+    :rtype: flask.Response
+    :return: Response object to return
+    """
+    token_string = read_bearer_token()
+    result = None
+    if token_string is not None:
+        result = verify_token(token_string)
+    if result is None or not result["valid"]:
+        resp = jsonify(message="Unauthorized: Invalid or missing OIDC token")
+        resp.status_code = 401
+        resp.headers["WWW-Authenticate"] = 'Bearer error="invalid_token"'
+        return resp
+    resp = Response(status=200)
+    claims = result["claims"]
+    for claim in current_app.config["VERIFY_CLAIM_HEADERS"]:
+        if claim in claims:
+            header = "-".join(x.capitalize() for x in claim.split("_"))
+            resp.headers[f"X-Actions-{header}"] = str(claims[claim])
+    return resp
+
+
+@probes.route("/healthz")
+def healthz() -> Response:
+    """
+    Liveness endpoint. The application is alive if it can serve requests.
+
+    Does not depend on any OpenID Provider or AWS, so that an outage of an
+    upstream service does not cause the application to be restarted.
+
+    :rtype: flask.Response
+    :return: Response object to return
+    """
+    resp = jsonify(status="ok")
+    resp.status_code = 200
+    return resp
+
+
+@probes.route("/readyz")
+def readyz() -> Response:
+    """
+    Readiness endpoint. The application is ready if it can verify OIDC tokens
+    without waiting on an OpenID Provider.
+
+    For each trusted issuer, the discovery metadata and JWKS must be loaded,
+    and the JWKS must have been fetched within 'READY_MAX_JWKS_AGE' seconds.
+    A JWKS that is not loaded or is stale is fetched in the background (see:
+    `oidc.JWKSCache.warm()`), so polling this endpoint warms the cache of a
+    new process. The endpoint does not wait on any OpenID Provider and is
+    cheap enough to poll every second.
+
+    Response (200 OK, if ready, otherwise 503 SERVICE UNAVAILABLE):
+
+      {
+        "ready": true,
+        "issuers": {
+          "https://token.actions.githubusercontent.com": {
+            "ready": true,
+            "discovery": true,
+            "keys": 2,
+            "age": 12.5,
+            "fresh": true,
+            "refreshing": false,
+            "failures": 0
+          }
+        }
+      }
+
+    NOTE: Caches are per process. With multiple worker processes, the
+    response reflects the process that served the request.
+
+    :rtype: flask.Response
+    :return: Response object to return
+    """
+    max_age = current_app.config["READY_MAX_JWKS_AGE"]
+    oauth = current_app.extensions["authlib.integrations.flask_client"]
+    validators = current_app.extensions["oidc_validator"].validators
+    issuers = {}
+    for issuer, validator in validators.items():
+        jwks = validator.public_key
+        if not isinstance(jwks, oidc.JWKSCache):
+            # Static public key.
+            issuers[issuer] = {"ready": True}
+            continue
+        jwks.warm()
+        status = jwks.status()
+        status["discovery"] = (
+            "_loaded_at" in oauth.create_client(issuer).server_metadata
+        )
+        status["ready"] = (
+            status["discovery"]
+            and status["keys"] > 0
+            and status["age"] is not None
+            and status["age"] <= max_age
+        )
+        issuers[issuer] = status
+    ready = all(x["ready"] for x in issuers.values())
+    resp = jsonify(ready=ready, issuers=issuers)
+    resp.status_code = 200 if ready else 503
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+def warm_up(app: Flask) -> None:
+    """
+    Load the discovery metadata and JWKS of each trusted issuer.
+
+    Errors are logged, rather than raised. Issuers that could not be loaded
+    are retried in the background by the 'readyz' endpoint and on demand by
+    requests.
+
+    :type app: Flask
+    :param app: Flask application
+
+    :rtype: None
+    :return: None
+    """
+    for validator in app.extensions["oidc_validator"].validators.values():
+        if isinstance(validator.public_key, oidc.JWKSCache):
+            validator.public_key.warm(blocking=True)
+
+
+def read_bearer_token() -> Optional[str]:
+    """
+    Read the OIDC token from the Authorization header of the request
+    (Authorization: Bearer xxxxx.yyyyy.zzzzz).
+
+    The header is parsed as by authlib's `ResourceProtector`, so the token is
+    the one validated by 'require_oidc', even if the token type and the token
+    are separated by more than one space.
+
+    :rtype: Optional[str]
+    :return: JSON Web Token (xxxxx.yyyyy.zzzzz) or None, if the request does
+      not contain a bearer token.
+    """
+    parts = request.headers.get("Authorization", "").split(None, 1)
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        return None
+    return parts[1]
+
+
+def verify_token(token_string: str) -> dict:
+    """
+    Verify an OIDC token using the application's validator.
+
+    :type token_string: str
+    :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+    :rtype: dict
+    :return: Verdict and, if valid, the claims of the OIDC token:
+
+      {"valid": true, "claims": {...}} or {"valid": false}
+    """
+    claims = current_app.extensions["oidc_validator"].verify_token(token_string)
+    if claims is None:
+        return {"valid": False}
+    return {"valid": True, "claims": dict(claims)}
+
+
 def generate_presigned_post(bucket: str, key: str, tagging: dict = {}) -> dict:
     """
     Generate a presigned POST request to upload an object to S3.
@@ -222,3 +813,46 @@ def generate_presigned_post(bucket: str, key: str, tagging: dict = {}) -> dict:
     except ClientError:
         raise
     return resp
+
+
+def generate_cached_presigned_post(
+    cache: ExpiringCache, bucket: str, key: str, tagging: dict = {}
+) -> tuple[dict, Optional[int]]:
+    """
+    Generate a presigned POST request to upload an object to S3 or return a
+    cached one.
+
+    Presigned POST requests are cached per (caller, bucket, key, tagging),
+    where the caller is identified by the 'sub' claim of the OIDC token. A
+    cached presigned POST request is returned while it has at least
+    'PRESIGNED_CACHE_MIN_REMAINING' of its lifetime (EXPIRES_IN) left.
+
+    :type cache: ExpiringCache
+    :param cache: Presigned POST request cache
+    :type bucket: str
+    :param bucket: Name of the S3 bucket.
+    :type key: str
+    :param key: Name of the S3 object key.
+    :type tagging: dict
+    :param tagging: Tags to add to the S3 object.
+
+    :rtype: tuple[dict, Optional[int]]
+    :return: The presigned POST request and its age (in seconds), if it was
+      found in the cache, otherwise None. See: `generate_presigned_post()`.
+    """
+    tagging_digest = hashlib.sha256(
+        json.dumps(tagging, sort_keys=True).encode()
+    ).hexdigest()
+    cache_key = (g.actions_claims["sub"], bucket, key, tagging_digest)
+    min_remaining = current_app.config["PRESIGNED_CACHE_MIN_REMAINING"]
+
+    def create() -> tuple[tuple[dict, float], float]:
+        created_at = time.time()
+        presigned_post = generate_presigned_post(
+            bucket=bucket, key=key, tagging=tagging
+        )
+        expires_at = created_at + EXPIRES_IN * (1 - min_remaining)
+        return (presigned_post, created_at), expires_at
+
+    (presigned_post, created_at), hit = cache.get_or_create(cache_key, create)
+    return presigned_post, int(time.time() - created_at) if hit else None
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+Audit trail.
+
+This module records which caller (repository, workflow, run, etc.) made which
+authenticated call (ex. which presigned POST request was generated for which
+run), without adding latency to requests.
+
+Records are appended to an in-memory, bounded queue on the request thread
+(O(1)). A background writer thread batches records into segments, each a
+gzip compressed JSONL file, and writes a segment to the sink once it holds
+`segment_max_records` records or its first record is `flush_interval` seconds
+old, whichever comes first.
+
+Sinks:
+
+  * file:///var/log/flask-oidc/audit: Local directory.
+  * s3://bucket/prefix/: S3 bucket (and key prefix).
+
+Segments are named '<YYYY>/<MM>/<DD>/<HHMMSS>-<hostname>-<pid>-<seq>.jsonl.gz',
+so that segments written by different pods and worker processes never
+collide.
+
+Backpressure: If the sink is slow or unavailable, the writer retries a
+failed segment with exponential backoff (up to WRITE_RETRIES times), while
+new records accumulate in the queue. Once the queue is full, the overflow
+policy applies:
+
+  * drop: The record is dropped (and counted). Requests are never delayed.
+  * block: The request waits up to `block_timeout` seconds for space in the
+    queue, then the record is dropped (and counted).
+
+Memory is bounded by `queue_max_records` plus a segment being written.
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections.abc import Mapping
+from typing import Optional
+from urllib.parse import urlparse
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies.
+DROP = "drop"
+BLOCK = "block"
+
+# Claims recorded for each authenticated call.
+AUDIT_CLAIMS = [
+    "iss",
+    "sub",
+    "jti",
+    "repository",
+    "repository_owner",
+    "actor",
+    "ref",
+    "sha",
+    "workflow",
+    "job_workflow_ref",
+    "run_id",
+    "run_attempt",
+]
+
+# The maximum number of queued records.
+QUEUE_MAX_RECORDS = 10000
+
+# The maximum number of records per segment.
+SEGMENT_MAX_RECORDS = 1000
+
+# The maximum number of seconds a record is queued before it is written.
+FLUSH_INTERVAL = 5
+
+# The maximum number of seconds a request waits for space in a full queue
+# ('block' overflow policy only).
+BLOCK_TIMEOUT = 0.1
+
+# The maximum number of seconds to wait for queued records to be written on
+# close (ex. when the process exits).
+CLOSE_TIMEOUT = 10
+
+# The maximum number of times a segment is retried, if it cannot be written.
+WRITE_RETRIES = 5
+
+# The number of seconds before a segment is first retried. The delay doubles
+# after each retry.
+WRITE_RETRY_DELAY = 1
+
+
+class FileSink(object):
+    """
+    Writes segments to a local directory.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Create a new `FileSink` object.
+
+        :type directory: str
+        :param directory: Directory to write segments to.
+
+        :rtype: None
+        :return: None
+        """
+        self.directory = directory
+
+    def write(self, name: str, data: bytes) -> None:
+        """
+        Write a segment. The segment is written to a temporary file first, so
+        that readers never see a partial segment.
+
+        :type name: str
+        :param name: Segment name (relative path).
+        :type data: bytes
+        :param data: Segment (gzip compressed JSONL).
+
+        :rtype: None
+        :return: None
+        """
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+
+class S3Sink(object):
+    """
+    Writes segments to an S3 bucket.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "") -> None:
+        """
+        Create a new `S3Sink` object.
+
+        :type bucket: str
+        :param bucket: Name of the S3 bucket.
+        :type prefix: str
+        :param prefix: Prefix for S3 object keys (ex. 'audit/').
+
+        :rtype: None
+        :return: None
+        """
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = None
+
+    def write(self, name: str, data: bytes) -> None:
+        """
+        Write a segment. See: `FileSink.write()`.
+        """
+        # NOTE: The client is created on the writer thread, since boto3
+        # clients should not be shared across processes.
+        if self._client is None:
+            self._client = boto3.client("s3")
+        self._client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + name,
+            Body=data,
+            ContentType="application/x-ndjson",
+            ContentEncoding="gzip",
+        )
+
+
+def sink_from_url(url: str):
+    """
+    Create a sink from a URL.
+
+    Example:
+
+      file:///var/log/flask-oidc/audit
+      s3://bucket/prefix/
+
+    :type url: str
+    :param url: Sink URL
+
+    :rtype: FileSink | S3Sink
+    :return: Sink
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return FileSink(parsed.path)
+    if parsed.scheme == "s3":
+        return S3Sink(parsed.netloc, parsed.path.lstrip("/"))
+    raise ValueError(f"Unsupported audit sink: {url}")
+
+
+class AuditLog(object):
+    """
+    Batched, asynchronous audit trail.
+
+    The writer thread is started by the first record in each process. This
+    allows the audit log to be created before worker processes are forked
+    (ex. Gunicorn's 'preload_app'), since threads do not survive a fork.
+    Queued records are written when the process exits.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        sink,
+        queue_max_records: int = QUEUE_MAX_RECORDS,
+        segment_max_records: int = SEGMENT_MAX_RECORDS,
+        flush_interval: float = FLUSH_INTERVAL,
+        overflow: str = DROP,
+        block_timeout: float = BLOCK_TIMEOUT,
+    ) -> None:
+        """
+        Create a new `AuditLog` object.
+
+        :type sink: FileSink | S3Sink
+        :param sink: Sink to write segments to.
+        :type queue_max_records: int
+        :param queue_max_records: Maximum number of queued records.
+        :type segment_max_records: int
+        :param segment_max_records: Maximum number of records per segment.
+        :type flush_interval: float
+        :param flush_interval: Maximum number of seconds a record is queued
+          before it is written.
+        :type overflow: str
+        :param overflow: Overflow policy ('drop' or 'block'), if the queue is
+          full.
+        :type block_timeout: float
+        :param block_timeout: Maximum number of seconds to wait for space in
+          the queue ('block' overflow policy only).
+
+        :rtype: None
+        :return: None
+        """
+        if overflow not in (DROP, BLOCK):
+            raise ValueError(f"Unsupported overflow policy: {overflow}")
+        self.sink = sink
+        self.queue_max_records = queue_max_records
+        self.segment_max_records = segment_max_records
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.written = 0
+        self.dropped = 0
+        self.failed_writes = 0
+        self._hostname = socket.gethostname()
+        self._seq = 0
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, event: str, claims: Mapping, **fields) -> bool:
+        """
+        Queue an audit record.
+
+        The record is serialized on the writer thread. Claims must not be
+        modified after they are recorded (ex. `ActionsClaims` is read-only).
+
+        :type event: str
+        :param event: Event name (ex. 'authenticate' or 'presigned').
+        :type claims: Mapping
+        :param claims: Claims of the OIDC token.
+        :type fields: dict
+        :param fields: Additional fields (must be JSON serializable).
+
+        :rtype: bool
+        :return: True, if the record was queued, otherwise False (dropped).
+        """
+        if self._pid != os.getpid():
+            self._start()
+        item = (time.time(), event, claims, fields)
+        try:
+            if self.overflow == BLOCK:
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Log the first dropped record, then every 1000th.
+            if dropped % 1000 == 1:
+                logger.warning("Audit queue full, %d record(s) dropped so far", dropped)
+            return False
+        return True
+
+    def close(self, timeout: Optional[float] = CLOSE_TIMEOUT) -> None:
+        """
+        Write all queued records and stop the writer thread.
+
+        :type timeout: Optional[float]
+        :param timeout: Maximum number of seconds to wait.
+
+        :rtype: None
+        :return: None
+        """
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None:
+                return
+            thread, self._thread = self._thread, None
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Audit queue full, queued records not written")
+            return
+        thread.join(timeout)
+
+    def _start(self) -> None:
+        """
+        Start the writer thread for the current process.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_max_records)
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name="audit", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def _run(self, q: queue.Queue) -> None:
+        """
+        Writer thread. Batches records into segments.
+        """
+        batch, deadline = [], None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+            try:
+                item = q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                if batch:
+                    self._write(batch)
+                return
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.segment_max_records or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch: list) -> None:
+        """
+        Write a segment, retrying with exponential backoff. The segment is
+        dropped, if it cannot be written.
+        """
+        data = gzip.compress(b"".join(self._encode(item) for item in batch))
+        self._seq += 1
+        name = "{}-{}-{}-{:06d}.jsonl.gz".format(
+            time.strftime("%Y/%m/%d/%H%M%S", time.gmtime()),
+            self._hostname,
+            os.getpid(),
+            self._seq,
+        )
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                self.sink.write(name, data)
+            except Exception:
+                self.failed_writes += 1
+                logger.exception("Error writing audit segment: %s", name)
+                if attempt < WRITE_RETRIES:
+                    time.sleep(WRITE_RETRY_DELAY * 2**attempt)
+                continue
+            with self._lock:
+                self.written += len(batch)
+            return
+        with self._lock:
+            self.dropped += len(batch)
+        logger.error("Dropped audit segment: %s (%d records)", name, len(batch))
+
+    @staticmethod
+    def _encode(item: tuple) -> bytes:
+        """
+        Serialize a record as a line of JSON.
+        """
+        timestamp, event, claims, fields = item
+        record = {
+            "time": round(timestamp, 3),
+            "event": event,
+            "claims": {x: claims[x] for x in AUDIT_CLAIMS if x in claims},
+        }
+        record.update(fields)
+        return json.dumps(record, separators=(",", ":"), default=str).encode() + b"\n"
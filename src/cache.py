@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory caching.
+
+This module provides a bounded, thread-safe cache in which each entry expires
+at its own time. It is used to cache values that are expensive to create, but
+remain valid for a known period of time (ex. STS credentials).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+# The maximum number of entries in a cache.
+MAX_ENTRIES = 1024
+
+# The number of locks used to serialize the creation of entries. Entries are
+# assigned a lock by the hash of their key.
+LOCK_STRIPES = 64
+
+
+class ExpiringCache(object):
+    """
+    Bounded, thread-safe cache in which each entry has an expiry time.
+
+    Expired entries are removed on lookup. Once the cache is full, the least
+    recently used entry is evicted.
+
+    `get_or_create()` ensures only one thread creates the value for a key at a
+    time. Other threads requesting the same key wait for, and then share, the
+    created value.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES) -> None:
+        """
+        Create a new `ExpiringCache` object.
+
+        :type max_entries: int
+        :param max_entries: Maximum number of entries in the cache.
+
+        :rtype: None
+        :return: None
+        """
+        self.max_entries = max_entries
+        # Mapping of key to (value, expires_at). Ordered from least to most
+        # recently used.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._create_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get the value for a key.
+
+        :type key: Hashable
+        :param key: Cache key
+
+        :rtype: Optional[Any]
+        :return: Value for the key or None, if the key does not exist or has
+          expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        """
+        Set the value for a key.
+
+        :type key: Hashable
+        :param key: Cache key
+        :type value: Any
+        :param value: Value
+        :type expires_at: float
+        :param expires_at: Time (seconds since the epoch) at which the entry
+          expires.
+
+        :rtype: None
+        :return: None
+        """
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_create(
+        self, key: Hashable, create: Callable[[], tuple[Any, float]]
+    ) -> tuple[Any, bool]:
+        """
+        Get the value for a key, creating it if it does not exist or has
+        expired.
+
+        :type key: Hashable
+        :param key: Cache key
+        :type create: Callable[[], tuple[Any, float]]
+        :param create: Callable returning the value and the time (seconds since
+          the epoch) at which it expires.
+
+        :rtype: tuple[Any, bool]
+        :return: The value and whether it was found in the cache.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        with self._create_locks[hash(key) % LOCK_STRIPES]:
+            # Another thread may have created the value in the meantime.
+            value = self.get(key)
+            if value is not None:
+                return value, True
+            value, expires_at = create()
+            self.set(key, value, expires_at)
+            return value, False
+
+    def clear(self) -> None:
+        """
+        Remove all entries from the cache.
+
+        :rtype: None
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+GitHub Actions OIDC token claims.
+
+This module provides a compact, read-only representation of the claims of a
+validated OIDC token generated from GitHub's OIDC Provider.
+
+See:
+  * https://docs.github.com/en/actions/deployment/security-hardening-your-deployments/about-security-hardening-with-openid-connect#understanding-the-oidc-token
+"""  # noqa
+import sys
+import time
+from collections.abc import Mapping
+from typing import Any, Iterator, Optional
+
+# Standard claims.
+STANDARD_CLAIMS = ("aud", "exp", "iat", "iss", "jti", "nbf", "sub")
+
+# Custom claims provided by GitHub.
+CUSTOM_CLAIMS = (
+    "actor",
+    "actor_id",
+    "base_ref",
+    "environment",
+    "event_name",
+    "head_ref",
+    "job_workflow_ref",
+    "job_workflow_sha",
+    "ref",
+    "ref_type",
+    "repository",
+    "repository_id",
+    "repository_owner",
+    "repository_owner_id",
+    "repository_visibility",
+    "run_attempt",
+    "run_id",
+    "run_number",
+    "sha",
+    "workflow",
+    "workflow_ref",
+    "workflow_sha",
+)
+
+# Claims whose values are shared by many OIDC tokens (ex. all tokens issued
+# for a repository). These values are interned, so that claims objects share
+# a single copy of each string.
+INTERNED_CLAIMS = frozenset(
+    (
+        "actor",
+        "actor_id",
+        "aud",
+        "base_ref",
+        "environment",
+        "event_name",
+        "head_ref",
+        "iss",
+        "job_workflow_ref",
+        "ref",
+        "ref_type",
+        "repository",
+        "repository_id",
+        "repository_owner",
+        "repository_owner_id",
+        "repository_visibility",
+        "workflow",
+        "workflow_ref",
+    )
+)
+
+CLAIMS = STANDARD_CLAIMS + CUSTOM_CLAIMS
+
+_CLAIMS = frozenset(CLAIMS)
+
+
+class ActionsClaims(Mapping):
+    """
+    Read-only claims of a validated GitHub Actions OIDC token.
+
+    Claims are stored as attributes (ex. `claims.repository`), rather than in
+    a dictionary. Claims not present in the OIDC token are None. Repeated
+    string values (ex. repository, owner, and workflow names) are interned.
+    Claims objects are immutable, so a single object can be shared by every
+    request presenting the same OIDC token.
+
+    For compatibility with existing code, claims are also accessible as a
+    read-only mapping (ex. `claims["repository"]`, `claims.get("sub")`).
+    Claims not known to this class are only accessible as a mapping.
+
+    Claims objects also implement the token interface expected by authlib's
+    `ResourceProtector` (see: authlib/oauth2/rfc6749/models.py:TokenMixin).
+    """
+
+    __slots__ = CLAIMS + ("branch", "tag", "_extra")
+
+    # standard claims
+    aud: str
+    exp: int
+    iat: int
+    iss: str
+    jti: str
+    nbf: int
+    sub: str
+    # custom claims
+    actor: str
+    actor_id: str
+    base_ref: Optional[str]
+    environment: Optional[str]
+    event_name: str
+    head_ref: Optional[str]
+    job_workflow_ref: str
+    job_workflow_sha: str
+    ref: str
+    ref_type: str
+    repository: str
+    repository_id: str
+    repository_owner: str
+    repository_owner_id: str
+    repository_visibility: str
+    run_attempt: str
+    run_id: str
+    run_number: str
+    sha: str
+    workflow: str
+    workflow_ref: str
+    workflow_sha: str
+    # derived values
+    branch: Optional[str]  # Ex. 'main' for ref 'refs/heads/main'
+    tag: Optional[str]  # Ex. 'v1.0.0' for ref 'refs/tags/v1.0.0'
+
+    def __init__(self, claims: Mapping) -> None:
+        """
+        Create a new `ActionsClaims` object.
+
+        :type claims: Mapping
+        :param claims: Claims of a validated OIDC token.
+
+        :rtype: None
+        :return: None
+        """
+        setattr_ = object.__setattr__
+        extra = None
+        for name in CLAIMS:
+            setattr_(self, name, None)
+        for name, value in claims.items():
+            if name in INTERNED_CLAIMS and type(value) is str:
+                value = sys.intern(value)
+            if name in _CLAIMS:
+                setattr_(self, name, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[name] = value
+        setattr_(self, "_extra", extra)
+        # Derived values.
+        ref = self.ref or ""
+        branch = tag = None
+        if ref.startswith("refs/heads/"):
+            branch = sys.intern(ref[11:])
+        elif ref.startswith("refs/tags/"):
+            tag = sys.intern(ref[10:])
+        setattr_(self, "branch", branch)
+        setattr_(self, "tag", tag)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __getitem__(self, name: str) -> Any:
+        if name in _CLAIMS:
+            value = getattr(self, name)
+            if value is not None:
+                return value
+        elif self._extra is not None and name in self._extra:
+            return self._extra[name]
+        raise KeyError(name)
+
+    def __iter__(self) -> Iterator[str]:
+        for name in CLAIMS:
+            if getattr(self, name) is not None:
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def __reduce__(self) -> tuple:
+        return type(self), (dict(self),)
+
+    # authlib token interface
+    def get_scope(self) -> Optional[str]:
+        return self.get("scope")
+
+    def get_expires_in(self) -> int:
+        return self.exp - self.iat
+
+    def is_expired(self) -> bool:
+        return self.exp < time.time()
+
+    def is_revoked(self) -> bool:
+        return False
@@ -13,13 +13,32 @@ store long-lived credentials.
 See:
   * https://docs.github.com/en/actions/deployment/security-hardening-your-deployments/about-security-hardening-with-openid-connect
 """  # noqa
-from typing import Any, Callable
-
+import base64
+import functools
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from authlib.common.encoding import urlsafe_b64decode
 from authlib.integrations.flask_client import FlaskOAuth2App
 from authlib.jose import JsonWebKey
+from authlib.jose.errors import InvalidTokenError, JoseError
 from authlib.jose.rfc7518.rsa_key import RSAKey
+from authlib.oauth2.rfc6750 import BearerTokenValidator
 from authlib.oauth2.rfc7523 import JWTBearerTokenValidator
-from flask import g
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+from flask import g, request
+
+from src.audit import AuditLog
+from src.cache import ExpiringCache
+from src.claims import ActionsClaims
+
+logger = logging.getLogger(__name__)
 
 # GitHub OpenID Provider issuer URI
 # See: https://openid.net/specs/openid-connect-discovery-1_0.html#IssuerDiscovery  # noqa
@@ -31,6 +50,19 @@ GITHUB_OPENID_CONFIGURATION_URI = (
     f"{GITHUB_OPENID_ISSUER_URI}/.well-known/openid-configuration"
 )
 
+# The number of seconds a JSON Web Key Set (JWKS) is considered fresh. A stale
+# JWKS is refetched on the next key lookup.
+JWKS_TTL = 300
+
+# The minimum number of seconds between attempts to fetch a JSON Web Key Set
+# (JWKS). Bounds the requests made to the OpenID Provider when presented with
+# JWTs signed with an unknown key or when the OpenID Provider is unavailable.
+JWKS_MIN_REFRESH_INTERVAL = 10
+
+# JOSE header parameters of RS256 JWTs validated without authlib. JWTs with
+# any other header parameter (ex. 'crit', 'jku', 'jwk') are left to authlib.
+RS256_HEADER_PARAMETERS = frozenset(("alg", "kid", "typ", "x5t"))
+
 
 class GitHubActionsOIDCTokenValidator(JWTBearerTokenValidator):
     """
@@ -48,7 +80,9 @@ class GitHubActionsOIDCTokenValidator(JWTBearerTokenValidator):
       * https://docs.github.com/en/actions/deployment/security-hardening-your-deployments/about-security-hardening-with-openid-connect
     """  # noqa
 
-    def __init__(self, public_key: str, issuer: str = None) -> None:
+    def __init__(
+        self, public_key: str, issuer: str = None, fast_verify: bool = False
+    ) -> None:
         super(GitHubActionsOIDCTokenValidator, self).__init__(
             public_key=public_key, issuer=issuer
         )
@@ -59,10 +93,16 @@ class GitHubActionsOIDCTokenValidator(JWTBearerTokenValidator):
         :param public_key: Public key of the OIDC token provider.
         :type issuer: str
         :param issuer: OpenID Provider issuer URI.
+        :type fast_verify: bool
+        :param fast_verify: Whether to verify RS256 JWTs directly using the
+          'cryptography' library (opt-in). See: `verify_rs256()`.
 
         :rtype: None
         :return: None
         """
+        self.fast_verify = fast_verify
+        # Public key (cryptography) prepared from a static `public_key`.
+        self._static_public_key = None
         # NOTE:
         #   * ONLY claims provided in the JWT payload are validated.
         #   * Specified claims must have a non-empty value.
@@ -105,7 +145,7 @@ class GitHubActionsOIDCTokenValidator(JWTBearerTokenValidator):
         if issuer:
             self.claims_options["iss"] = {"essential": True, "value": issuer}
 
-    def authenticate_token(self, token_string: str) -> dict:
+    def authenticate_token(self, token_string: str) -> Optional[ActionsClaims]:
         """
         Validate the OIDC token.
 
@@ -131,44 +171,311 @@ class GitHubActionsOIDCTokenValidator(JWTBearerTokenValidator):
         :type token_string: str
         :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
 
-        :rtype: dict
-        :return: Dictionary of 'claims_supported'
+        :rtype: Optional[ActionsClaims]
+        :return: Read-only mapping of 'claims_supported' or None, if the OIDC
+          token is invalid. See: src/claims.py.
           See: https://token.actions.githubusercontent.com/.well-known/openid-configuration
           for a list of the Claim Names.
         """  # noqa
+        result = self.verify_token(token_string=token_string)
+        # Makes claims available to the application context.
+        g.actions_claims = result
+        return result
+
+    def verify_token(self, token_string: str) -> Optional[ActionsClaims]:
+        """
+        Validate the OIDC token. Unlike `authenticate_token()`, this method
+        does not require (or modify) the application context.
+
+        :type token_string: str
+        :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+        :rtype: Optional[ActionsClaims]
+        :return: Read-only mapping of 'claims_supported' or None, if the OIDC
+          token is invalid. See: src/claims.py.
+        """
+        if self.fast_verify:
+            result = self.verify_rs256(token_string=token_string)
+            if result is not NotImplemented:
+                return result
         result = super(GitHubActionsOIDCTokenValidator, self).authenticate_token(
             token_string=token_string
         )
+        # Replace authlib's claims (a dict subclass) with a compact, read-only
+        # claims object.
+        if result is not None:
+            result = ActionsClaims(result)
+        return result
+
+    def verify_rs256(self, token_string: str) -> Optional[ActionsClaims]:
+        """
+        Validate an RS256 JWT directly using the 'cryptography' library.
+
+        authlib's generic JSON Web Signature (JWS) machinery parses headers,
+        resolves the algorithm by name, and wraps the key for every JWT. Since
+        GitHub's OIDC Provider only issues RS256 JWTs, the signature can be
+        verified directly with the (already prepared) public key for the
+        'kid' of the JWT. The payload is then validated by the same claims
+        checks as authlib's.
+
+        JWTs that are not plain RS256 JWTs (ex. other algorithms, additional
+        header parameters, or non-RSA keys) are left to authlib.
+
+        :type token_string: str
+        :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+        :rtype: Optional[ActionsClaims]
+        :return: Read-only mapping of 'claims_supported', None, if the OIDC
+          token is invalid, or NotImplemented, if the OIDC token must be
+          validated by authlib.
+        """
+        try:
+            header_segment, payload_segment, signature_segment = token_string.split(".")
+            header = json.loads(urlsafe_b64decode(header_segment.encode()))
+        except ValueError:
+            return NotImplemented
+        if (
+            not isinstance(header, dict)
+            or header.get("alg") != "RS256"
+            or not header.keys() <= RS256_HEADER_PARAMETERS
+        ):
+            return NotImplemented
+        public_key = self._resolve_rsa_public_key(header)
+        if public_key is NotImplemented:
+            return NotImplemented
+        if public_key is None:
+            return None
+        try:
+            public_key.verify(
+                urlsafe_b64decode(signature_segment.encode()),
+                f"{header_segment}.{payload_segment}".encode(),
+                padding.PKCS1v15(),
+                hashes.SHA256(),
+            )
+            payload = json.loads(urlsafe_b64decode(payload_segment.encode()))
+        except (InvalidSignature, ValueError) as ex:
+            logger.debug("Authenticate token failed. %r", ex)
+            return None
+        if not isinstance(payload, dict):
+            return None
+        claims = self.token_cls(payload, header, options=self.claims_options)
+        try:
+            claims.validate()
+        except JoseError as ex:
+            logger.debug("Authenticate token failed. %r", ex)
+            return None
+        return ActionsClaims(claims)
+
+    def _resolve_rsa_public_key(self, header: dict) -> Optional[RSAPublicKey]:
+        """
+        Resolve the prepared RSA public key for the JWT.
+
+        :type header: dict
+        :param header: JSON Web Token (JWT) header
+
+        :rtype: Optional[RSAPublicKey]
+        :return: RSA public key, None, if no key exists for the 'kid' of the
+          JWT or the key may not be used to verify signatures, or
+          NotImplemented, if the key must be checked by authlib (ex. the key
+          is not an RSA key).
+        """
+        if self._static_public_key is not None:
+            return self._static_public_key
+        if callable(self.public_key):
+            try:
+                key = self.public_key(header, None)
+            except JoseError as ex:
+                logger.debug("Authenticate token failed. %r", ex)
+                return None
+            static = False
+        else:
+            key, static = self.public_key, True
+        try:
+            key = RSAKey.import_key(key)
+        except Exception:
+            return NotImplemented
+        # Reject keys that are not intended for verifying signatures (ex.
+        # 'use': 'enc'), as authlib does.
+        try:
+            key.check_key_op("verify")
+        except JoseError as ex:
+            logger.debug("Authenticate token failed. %r", ex)
+            return None
+        except ValueError:
+            # 'key_ops' does not include 'verify'.
+            return NotImplemented
+        public_key = key.get_public_key()
+        if not isinstance(public_key, RSAPublicKey):
+            return NotImplemented
+        if static:
+            self._static_public_key = public_key
+        return public_key
+
+
+class MultiIssuerOIDCTokenValidator(BearerTokenValidator):
+    """
+    Validates an OpenID Connect (OIDC) token from one of several trusted OIDC
+    Providers (ex. github.com and GitHub Enterprise Server instances).
+
+    Each trusted issuer is served by its own `GitHubActionsOIDCTokenValidator`
+    and, by extension, its own JSON Web Key Set (JWKS) cache. The 'iss' claim
+    is read from the unverified JWT payload and used to look up the validator
+    for the issuer. The selected validator then verifies the JWT signature and
+    claims (including 'iss') as usual.
+
+    If a cache is given, the claims of valid OIDC tokens are cached until the
+    OIDC token expires. Subsequent requests presenting the same OIDC token
+    share the cached (read-only) claims object. Invalid OIDC tokens are not
+    cached, since they may become valid once the JWKS is refreshed (ex. a JWT
+    signed with a new key).
+
+    If an audit log is given, each request authenticated with a valid OIDC
+    token is recorded (see: src/audit.py).
+    """
+
+    def __init__(
+        self,
+        validators: dict[str, GitHubActionsOIDCTokenValidator],
+        cache: Optional[ExpiringCache] = None,
+        audit: Optional[AuditLog] = None,
+    ) -> None:
+        """
+        Create a new `MultiIssuerOIDCTokenValidator` object.
+
+        :type validators: dict[str, GitHubActionsOIDCTokenValidator]
+        :param validators: Mapping of OpenID Provider issuer URI to the
+          validator for OIDC tokens issued by that OpenID Provider.
+        :type cache: Optional[ExpiringCache]
+        :param cache: Cache of the claims of valid OIDC tokens.
+        :type audit: Optional[AuditLog]
+        :param audit: Audit log of authenticated requests.
+
+        :rtype: None
+        :return: None
+        """
+        super(MultiIssuerOIDCTokenValidator, self).__init__()
+        self.validators = validators
+        self.cache = cache
+        self.audit = audit
+
+    def authenticate_token(self, token_string: str) -> Optional[ActionsClaims]:
+        """
+        Validate the OIDC token using the validator for its issuer.
+
+        NOTE: This method makes claims available to the application context via
+        the 'g' object.
+
+        :type token_string: str
+        :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+        :rtype: Optional[ActionsClaims]
+        :return: Read-only mapping of 'claims_supported' or None, if the OIDC token
+          is invalid or was not issued by a trusted OpenID Provider.
+        """
+        result = self.verify_token(token_string=token_string)
         # Makes claims available to the application context.
         g.actions_claims = result
+        if result is not None and self.audit is not None:
+            self.audit.record(
+                "authenticate", result, method=request.method, path=request.path
+            )
         return result
 
+    def verify_token(self, token_string: str) -> Optional[ActionsClaims]:
+        """
+        Validate the OIDC token using the validator for its issuer. Unlike
+        `authenticate_token()`, this method does not require (or modify) the
+        application context.
 
-def fetch_github_oidc_public_key(client: FlaskOAuth2App) -> Callable:
-    """
-    Callable to retrieve the public key from the Authorization Server.
+        :type token_string: str
+        :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
 
-    This ultimately gets called during the decoding of the JWT token in
-    JsonWebSignature._prepare_algorithm_key:
+        :rtype: Optional[ActionsClaims]
+        :return: Read-only mapping of 'claims_supported' or None, if the OIDC token
+          is invalid or was not issued by a trusted OpenID Provider.
+        """
+        if self.cache is not None:
+            result = self.cache.get(token_string)
+            if result is not None:
+                return result
+        issuer = read_unverified_issuer(token_string)
+        validator = self.validators.get(issuer)
+        if validator is None:
+            logger.debug("Authenticate token failed. Untrusted issuer: %r", issuer)
+            return None
+        result = validator.verify_token(token_string=token_string)
+        if result is not None and self.cache is not None:
+            self.cache.set(token_string, result, result.exp)
+        return result
 
-      if callable(key):
-          key = key(header, payload)
-          ...
 
-    :type client: FlaskOAuth2App
-    :param client: Flask OAuth2 Client
+class JWKSCache(object):
+    """
+    Cache of the JSON Web Key Set (JWKS) of a single OpenID Provider.
+
+    Keys are indexed by their 'kid' property. The JWKS is refetched when:
+      * The JWKS is older than `ttl` seconds. Attempts are limited to one
+        every `min_refresh_interval` seconds.
+      * A JWT is signed with an unknown key (ex. after a key rotation). These
+        refreshes are limited to one every `min_refresh_interval` seconds, so
+        a flood of JWTs with a bogus 'kid' cannot flood the OpenID Provider.
+        The limit is separate from the limit on refreshes of a stale JWKS, so
+        a key published shortly after a refresh is still picked up.
+
+    Only one thread refreshes the JWKS at a time. Threads presenting the same
+    unknown key wait on the refresh in progress, rather than fetch the JWKS
+    again. If a stale key is available, other threads continue to use it
+    rather than wait on the refresh. If the refresh fails, stale keys continue
+    to be used until the next attempt.
+
+    Each OpenID Provider has its own cache (and lock), so a slow or
+    unavailable OpenID Provider does not affect any other.
+
+    The JWKS can be fetched ahead of requests (see: `warm()`), so that the
+    first requests do not wait on the OpenID Provider.
+    """
 
-    :rtype: Callable
-    :return: Callable for fetching GitHub's OIDC Provider public key for the
-      JWT.
+    def __init__(
+        self,
+        fetch_jwk_set: Callable[[], dict],
+        ttl: float = JWKS_TTL,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL,
+    ) -> None:
+        """
+        Create a new `JWKSCache` object.
 
-    Inspired by:
-      * https://github.com/lepture/authlib/commit/695af265255853310c905dcd48b439955148516f#r48195848
-    """  # noqa
+        :type fetch_jwk_set: Callable[[], dict]
+        :param fetch_jwk_set: Callable returning the JWKS of the OpenID
+          Provider.
+        :type ttl: float
+        :param ttl: Number of seconds the JWKS is considered fresh.
+        :type min_refresh_interval: float
+        :param min_refresh_interval: Minimum number of seconds between
+          attempts to fetch the JWKS.
 
-    # TODO: Add caching, since this implmentation retrieves the JWKS on every
-    # invocation of client.fetch_jwk_set.
-    def resolve_public_key(header: dict[str, Any], _: dict[str, Any]) -> RSAKey:
+        :rtype: None
+        :return: None
+        """
+        self.fetch_jwk_set = fetch_jwk_set
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        # Mapping of 'kid' to key. Replaced (never mutated) on refresh, so it
+        # can be read without holding the lock.
+        self.keys = {}
+        # Monotonic time of the last successful fetch of the JWKS.
+        self.loaded_at = None
+        # Monotonic time of the last attempt to fetch the JWKS.
+        self.fetched_at = None
+        # Monotonic time of the last attempt to fetch the JWKS for an unknown
+        # key.
+        self.missed_at = None
+        # Number of attempts to fetch the JWKS.
+        self.attempts = 0
+        # Number of consecutive failed attempts to fetch the JWKS.
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, header: dict[str, Any], _: dict[str, Any]) -> RSAKey:
         """
         Resolve the public key used to verify the JSON Web Token (JWT).
 
@@ -210,19 +517,243 @@ def fetch_github_oidc_public_key(client: FlaskOAuth2App) -> Callable:
         :return: Object representing a JSON Web Key using the RS256 signing
           algorithm. See: authlib/jose/rfc7518/rsa_key.py.
         """  # noqa
-        # The JSON Web Key Set (JWKS) is a set of keys containing the public
-        # keys used to verify any JSON Web Token (JWT) issued by the
-        # Authorization Server and signed using the RS256 signing algorithm.
-        #
-        # The JWKS endpoint is specified in the OIDC Provider configuration
-        # by 'jwks_uri'.
-        jwk_set = JsonWebKey.import_key_set(client.fetch_jwk_set(force=True))
         # Filter for the signing key using the 'kid' property from the header
         # of the decoded JWT. The signing key should have a matching 'kid'
         # property. The 'x5c' property contains the public key.
         #
         # See: https://www.rfc-editor.org/rfc/rfc7517#section-4.7
-        public_key = jwk_set.find_by_kid(header.get("kid"))
+        kid = header.get("kid")
+        public_key = self.get(kid)
+        if public_key is None:
+            raise InvalidTokenError(description=f"Unknown 'kid': {kid!r}")
         return public_key
 
-    return resolve_public_key
+    def get(self, kid: str) -> Optional[RSAKey]:
+        """
+        Get the key with the given 'kid' property, refreshing the JWKS if
+        needed.
+
+        :type kid: str
+        :param kid: Key ID
+
+        :rtype: Optional[RSAKey]
+        :return: Key with the given 'kid' property or None, if no such key
+          exists.
+        """
+        # The 'kid' is read from the (unverified) JWT header, so it may be of
+        # any JSON type. A key ID is always a string.
+        if not isinstance(kid, str):
+            return None
+        now = time.monotonic()
+        attempts, fetched_at, loaded_at = self.attempts, self.fetched_at, self.loaded_at
+        key = self.keys.get(kid)
+        if key is None:
+            # Wait on the refresh in progress (if any), since the key may have
+            # been published since the JWKS was fetched.
+            self.refresh(seen=attempts, unknown_kid=True)
+            return self.keys.get(kid)
+        if now - loaded_at < self.ttl:
+            return key
+        if fetched_at is not None and now - fetched_at < self.min_refresh_interval:
+            return key
+        # Do not wait on another thread's refresh, since a (stale) key is
+        # available.
+        self.refresh(seen=attempts, blocking=False)
+        return self.keys.get(kid)
+
+    def refresh(
+        self,
+        seen: Optional[int] = None,
+        blocking: bool = True,
+        unknown_kid: bool = False,
+    ) -> None:
+        """
+        Fetch the JWKS from the OpenID Provider.
+
+        :type seen: Optional[int]
+        :param seen: Value of `attempts` observed by the caller. If another
+          thread fetched the JWKS in the meantime, the JWKS is not fetched
+          again.
+        :type blocking: bool
+        :param blocking: Whether to wait for a refresh in progress in another
+          thread.
+        :type unknown_kid: bool
+        :param unknown_kid: Whether the refresh is for an unknown key. These
+          refreshes are limited to one every `min_refresh_interval` seconds.
+
+        :rtype: None
+        :return: None
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            if seen is not None and self.attempts != seen:
+                return
+            now = time.monotonic()
+            if unknown_kid:
+                missed_at = self.missed_at
+                if (
+                    missed_at is not None
+                    and now - missed_at < self.min_refresh_interval
+                ):
+                    return
+                self.missed_at = now
+            self.attempts += 1
+            try:
+                # The JSON Web Key Set (JWKS) is a set of keys containing the
+                # public keys used to verify any JSON Web Token (JWT) issued
+                # by the Authorization Server and signed using the RS256
+                # signing algorithm.
+                #
+                # The JWKS endpoint is specified in the OIDC Provider
+                # configuration by 'jwks_uri'.
+                jwk_set = JsonWebKey.import_key_set(self.fetch_jwk_set())
+            except Exception:
+                self.fetched_at = now
+                self.failures += 1
+                if self.loaded_at is None:
+                    raise
+                logger.warning(
+                    "Failed to refresh JWKS. Using stale keys.", exc_info=True
+                )
+                return
+            self.keys = {k.kid: k for k in jwk_set.keys}
+            self.fetched_at = self.loaded_at = now
+            self.failures = 0
+        finally:
+            self._lock.release()
+
+    def warm(self, blocking: bool = False) -> None:
+        """
+        Fetch the JWKS ahead of requests, if it is not loaded or is stale.
+
+        Unlike `refresh()`, attempts are limited to one every
+        `min_refresh_interval` seconds and errors are logged, rather than
+        raised.
+
+        :type blocking: bool
+        :param blocking: Whether to fetch the JWKS in the calling thread,
+          rather than a background thread.
+
+        :rtype: None
+        :return: None
+        """
+        now = time.monotonic()
+        attempts, fetched_at, loaded_at = self.attempts, self.fetched_at, self.loaded_at
+        if loaded_at is not None and now - loaded_at < self.ttl:
+            return
+        if fetched_at is not None and now - fetched_at < self.min_refresh_interval:
+            return
+        if self._lock.locked():
+            return
+        if blocking:
+            self._warm(attempts)
+        else:
+            threading.Thread(target=self._warm, args=(attempts,), daemon=True).start()
+
+    def _warm(self, seen: int) -> None:
+        """
+        Fetch the JWKS, unless another thread has fetched it since `seen`.
+        """
+        try:
+            self.refresh(seen=seen, blocking=False)
+        except Exception:
+            logger.warning("Failed to fetch JWKS.", exc_info=True)
+
+    def status(self) -> dict:
+        """
+        Get the state of the cache.
+
+        :rtype: dict
+        :return: Dictionary with the following keys:
+          * keys: Number of keys.
+          * age: Number of seconds since the JWKS was fetched or None, if the
+            JWKS has never been fetched.
+          * fresh: Whether the JWKS is younger than `ttl` seconds.
+          * refreshing: Whether the JWKS is being fetched.
+          * failures: Number of consecutive failed attempts to fetch the JWKS.
+        """
+        now = time.monotonic()
+        loaded_at = self.loaded_at
+        return {
+            "keys": len(self.keys),
+            "age": None if loaded_at is None else round(now - loaded_at, 1),
+            "fresh": loaded_at is not None and now - loaded_at < self.ttl,
+            "refreshing": self._lock.locked(),
+            "failures": self.failures,
+        }
+
+
+def read_unverified_issuer(token_string: str) -> Optional[str]:
+    """
+    Read the 'iss' claim from the payload of a JWT *without* verifying it.
+
+    This is only suitable for selecting which issuer the JWT should be
+    verified against. The JWT signature and claims must still be verified.
+
+    :type token_string: str
+    :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+    :rtype: Optional[str]
+    :return: Value of the 'iss' claim or None, if the JWT is malformed or the
+      'iss' claim is not a string.
+    """
+    try:
+        payload = token_string.split(".", 2)[1]
+        # NOTE: The payload of the JWT is base64url encoded without padding.
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        issuer = claims.get("iss")
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return None
+    # NOTE: The payload is not verified, so the 'iss' claim may be any JSON
+    # value (ex. a list, which cannot be used to look up a validator).
+    return issuer if isinstance(issuer, str) else None
+
+
+def openid_configuration_uri(issuer: str) -> str:
+    """
+    Get the OpenID Provider configuration URI for an issuer.
+
+    See: https://openid.net/specs/openid-connect-discovery-1_0.html#ProviderConfig
+
+    :type issuer: str
+    :param issuer: OpenID Provider issuer URI.
+      Ex: https://token.actions.githubusercontent.com
+      Ex: https://HOSTNAME/_services/token (GitHub Enterprise Server)
+
+    :rtype: str
+    :return: OpenID Provider configuration URI.
+    """  # noqa
+    return f"{issuer.rstrip('/')}/.well-known/openid-configuration"
+
+
+def fetch_github_oidc_public_key(
+    client: FlaskOAuth2App, ttl: float = JWKS_TTL
+) -> JWKSCache:
+    """
+    Callable to retrieve the public key from the Authorization Server.
+
+    This ultimately gets called during the decoding of the JWT token in
+    JsonWebSignature._prepare_algorithm_key:
+
+      if callable(key):
+          key = key(header, payload)
+          ...
+
+    The JSON Web Key Set (JWKS) is cached. See: `JWKSCache`.
+
+    :type client: FlaskOAuth2App
+    :param client: Flask OAuth2 Client
+    :type ttl: float
+    :param ttl: Number of seconds the JWKS is considered fresh.
+
+    :rtype: JWKSCache
+    :return: Callable for fetching GitHub's OIDC Provider public key for the
+      JWT.
+
+    Inspired by:
+      * https://github.com/lepture/authlib/commit/695af265255853310c905dcd48b439955148516f#r48195848
+    """  # noqa
+    return JWKSCache(functools.partial(client.fetch_jwk_set, force=True), ttl=ttl)
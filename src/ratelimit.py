@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limiting.
+
+This module is used to limit the rate at which callers (identified by a claim
+of their OIDC token, ex. 'repository') can call protected API endpoints.
+
+Each limit is a token bucket holding up to `limit` tokens, which refills at a
+rate of `limit / period` tokens per second. A request consumes one token from
+the bucket of each configured limit. A request is rejected if any bucket is
+empty, in which case no token is consumed from any bucket. A rejected request
+therefore does not count against the other limits (ex. retries rejected by a
+per-repository limit do not use up the quota of the repository owner). A
+limit with a long period (ex. a day) acts as a quota.
+
+Example:
+
+  [
+    {"claim": "repository", "limit": 60, "period": 60},
+    {"claim": "repository_owner", "limit": 10000, "period": 86400}
+  ]
+
+Buckets are kept in memory (per process) by default. To share buckets between
+multiple workers, use a Redis backend (requires the 'redis' package).
+
+See:
+  * https://en.wikipedia.org/wiki/Token_bucket
+"""
+import threading
+import time
+from collections.abc import Mapping
+from typing import Optional
+
+# The number of locks guarding the in-memory buckets. Buckets are assigned a
+# lock by the hash of their key, so concurrent requests from different callers
+# rarely contend for the same lock.
+LOCK_STRIPES = 64
+
+# The maximum number of in-memory buckets (per lock stripe) before full (idle)
+# buckets are pruned.
+MAX_BUCKETS_PER_STRIPE = 1024
+
+
+class MemoryBackend(object):
+    """
+    In-memory token bucket storage.
+
+    Buckets are partitioned into stripes, each with its own lock. Only the
+    stripes containing the buckets of a request are locked while the buckets
+    are updated.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create a new `MemoryBackend` object.
+
+        :rtype: None
+        :return: None
+        """
+        self._stripes = [{} for _ in range(LOCK_STRIPES)]
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def consume(
+        self, buckets: list[tuple[str, float, float]]
+    ) -> Optional[tuple[int, float]]:
+        """
+        Consume a token from each bucket, if every bucket holds a token.
+        Otherwise, no token is consumed.
+
+        :type buckets: list[tuple[str, float, float]]
+        :param buckets: List of (key, limit, period), where `limit` is the
+          capacity of the bucket and `period` is the number of seconds for an
+          empty bucket to refill.
+
+        :rtype: Optional[tuple[int, float]]
+        :return: None, if a token was consumed from each bucket, otherwise the
+          index of the bucket with the longest wait and the number of seconds
+          until it holds a token.
+        """
+        # Lock the stripes of all buckets in a consistent order, so
+        # concurrent requests cannot deadlock.
+        locks = [
+            self._locks[i]
+            for i in sorted({hash(key) % LOCK_STRIPES for key, _, _ in buckets})
+        ]
+        for lock in locks:
+            lock.acquire()
+        try:
+            now = time.monotonic()
+            updates, exceeded = [], None
+            for index, (key, limit, period) in enumerate(buckets):
+                stripe = self._stripes[hash(key) % LOCK_STRIPES]
+                rate = limit / period
+                # A bucket is stored as [tokens, updated_at, limit, rate].
+                bucket = stripe.get(key)
+                tokens = limit
+                if bucket is not None:
+                    tokens = min(limit, bucket[0] + (now - bucket[1]) * rate)
+                if tokens < 1:
+                    retry_after = (1 - tokens) / rate
+                    if exceeded is None or retry_after > exceeded[1]:
+                        exceeded = (index, retry_after)
+                updates.append((stripe, key, tokens, limit, rate))
+            if exceeded is not None:
+                return exceeded
+            for stripe, key, tokens, limit, rate in updates:
+                if key not in stripe and len(stripe) >= MAX_BUCKETS_PER_STRIPE:
+                    self._prune(stripe, now)
+                stripe[key] = [tokens - 1, now, limit, rate]
+            return None
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    @staticmethod
+    def _prune(buckets: dict, now: float) -> None:
+        """
+        Remove buckets that have refilled. A removed bucket is equivalent to a
+        new (full) bucket.
+        """
+        for key, (tokens, updated_at, limit, rate) in list(buckets.items()):
+            if tokens + (now - updated_at) * rate >= limit:
+                del buckets[key]
+
+
+class RedisBackend(object):
+    """
+    Redis token bucket storage.
+
+    Buckets are shared by all workers using the same Redis server. The buckets
+    of a request are checked and updated atomically by a single Lua script.
+    """
+
+    # KEYS: bucket keys
+    # ARGV: now, then limit and period for each bucket
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local exceeded, retry_after = 0, 0
+for i = 1, #KEYS do
+  local limit = tonumber(ARGV[2 * i])
+  local rate = limit / tonumber(ARGV[2 * i + 1])
+  local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'updated_at')
+  local t = tonumber(bucket[1]) or limit
+  local updated_at = tonumber(bucket[2]) or now
+  t = math.min(limit, t + math.max(0, now - updated_at) * rate)
+  tokens[i] = t
+  if t < 1 and (1 - t) / rate > retry_after then
+    exceeded, retry_after = i, (1 - t) / rate
+  end
+end
+if exceeded == 0 then
+  for i = 1, #KEYS do
+    redis.call('HSET', KEYS[i], 'tokens', tokens[i] - 1, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[i], math.ceil(tonumber(ARGV[2 * i + 1])))
+  end
+end
+return {exceeded, tostring(retry_after)}
+"""
+
+    def __init__(self, client, prefix: str = "flask-oidc:ratelimit:") -> None:
+        """
+        Create a new `RedisBackend` object.
+
+        :type client: redis.Redis
+        :param client: Redis client
+        :type prefix: str
+        :param prefix: Prefix for bucket keys.
+
+        :rtype: None
+        :return: None
+        """
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        """
+        Create a new `RedisBackend` object from a Redis URL.
+
+        :type url: str
+        :param url: Redis URL (ex. redis://localhost:6379/0)
+
+        :rtype: RedisBackend
+        :return: Redis backend
+        """
+        try:
+            import redis
+        except ImportError as ex:
+            raise RuntimeError(
+                "The 'redis' package is required to use a Redis backend"
+            ) from ex
+        return cls(redis.Redis.from_url(url))
+
+    def consume(
+        self, buckets: list[tuple[str, float, float]]
+    ) -> Optional[tuple[int, float]]:
+        """
+        Consume a token from each bucket, if every bucket holds a token. See:
+        `MemoryBackend.consume()`.
+        """
+        args = [time.time()]
+        for _, limit, period in buckets:
+            args += [limit, period]
+        exceeded, retry_after = self._script(
+            keys=[self.prefix + key for key, _, _ in buckets], args=args
+        )
+        if not exceeded:
+            return None
+        return int(exceeded) - 1, float(retry_after)
+
+
+class RateLimiter(object):
+    """
+    Limits the rate of requests per caller.
+    """
+
+    def __init__(self, limits: list[dict], backend=None) -> None:
+        """
+        Create a new `RateLimiter` object.
+
+        :type limits: list[dict]
+        :param limits: List of limits. Each limit is a dictionary with the
+          following keys:
+            * claim: Claim identifying the caller (ex. 'repository',
+              'repository_owner', or 'actor').
+            * limit: Maximum number of requests (bucket capacity).
+            * period: Number of seconds over which `limit` requests are
+              allowed (seconds for an empty bucket to refill).
+        :type backend: MemoryBackend | RedisBackend
+        :param backend: Token bucket storage. Defaults to `MemoryBackend`.
+
+        :rtype: None
+        :return: None
+        """
+        self.limits = [
+            (limit["claim"], float(limit["limit"]), float(limit["period"]))
+            for limit in limits
+        ]
+        self.backend = backend or MemoryBackend()
+
+    def acquire(self, claims: Mapping) -> Optional[tuple[str, float]]:
+        """
+        Consume a token from the bucket of each limit, if no limit is
+        exceeded. Otherwise, no token is consumed.
+
+        :type claims: Mapping
+        :param claims: Claims of the OIDC token.
+
+        :rtype: Optional[tuple[str, float]]
+        :return: None, if the request is allowed, otherwise the claim of the
+          exceeded limit (with the longest wait, if several are exceeded) and
+          the number of seconds until the request may be retried.
+        """
+        if not self.limits:
+            return None
+        exceeded = self.backend.consume(
+            [
+                (f"{i}:{claim}:{claims.get(claim, '')}", limit, period)
+                for i, (claim, limit, period) in enumerate(self.limits)
+            ]
+        )
+        if exceeded is None:
+            return None
+        index, retry_after = exceeded
+        return self.limits[index][0], retry_after
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+AWS credential vending.
+
+This module is used to exchange a verified OIDC token for short-lived AWS
+credentials using the AWS Security Token Service (STS).
+
+The IAM role is selected by a policy: an ordered list of rules, each of which
+specifies an IAM role and the claims an OIDC token must have to assume it.
+Credentials are cached until shortly before they expire. The cache key
+depends on the mode used to assume the IAM role:
+
+  * assume_role: The policy rule is the only authorization check, so
+    credentials are cached per (role, issuer, session key). The session key
+    is derived from the claims of the OIDC token. By default, all jobs in a
+    workflow run share a session key and, thereby, a single STS call.
+  * assume_role_with_web_identity: The trust policy of the IAM role is the
+    authorization check and may depend on any claim of the OIDC token (ex.
+    'sub' or 'job_workflow_ref'). Credentials are cached per (role, OIDC
+    token), so that every OIDC token is checked by STS. Retries presenting
+    the same OIDC token share a single STS call.
+
+See:
+  * https://docs.aws.amazon.com/STS/latest/APIReference/API_AssumeRole.html
+  * https://docs.aws.amazon.com/STS/latest/APIReference/API_AssumeRoleWithWebIdentity.html
+"""  # noqa
+import fnmatch
+import hashlib
+import re
+from collections.abc import Mapping
+from typing import Optional
+
+import boto3
+
+from src.cache import ExpiringCache
+
+# Modes for assuming an IAM role:
+#   * ASSUME_ROLE: Use the credentials of this application (sts:AssumeRole).
+#   * ASSUME_ROLE_WITH_WEB_IDENTITY: Use the OIDC token presented to this
+#     application (sts:AssumeRoleWithWebIdentity). The IAM role must trust
+#     the OpenID Provider that issued the OIDC token.
+ASSUME_ROLE = "assume_role"
+ASSUME_ROLE_WITH_WEB_IDENTITY = "assume_role_with_web_identity"
+
+# The number of seconds the AWS credentials are valid.
+DURATION_SECONDS = 3600
+
+# The number of seconds before expiry at which cached credentials are no
+# longer vended, so callers have time to use them.
+EXPIRY_MARGIN = 300
+
+# Claims from which the session key (and, thereby, the IAM role session name)
+# is derived. In 'assume_role' mode, OIDC tokens from the same issuer with the
+# same values for these claims share credentials for a role.
+SESSION_KEY_CLAIMS = ["repository", "run_id", "run_attempt"]
+
+
+def select_role(policy: list[dict], claims: Mapping) -> Optional[dict]:
+    """
+    Select the first rule of the policy matching the claims.
+
+    A rule matches if, for each claim in the rule, the claim of the OIDC
+    token matches the (fnmatch-style) pattern. A rule without claims matches
+    any OIDC token.
+
+    Example:
+
+      [
+        {
+          "role_arn": "arn:aws:iam::123456789012:role/deploy",
+          "claims": {"repository": "nickolashkraus/*", "ref": "refs/heads/master"},
+          "mode": "assume_role_with_web_identity",
+          "duration_seconds": 3600,
+          "session_key": ["repository", "run_id", "run_attempt"]
+        }
+      ]
+
+    :type policy: list[dict]
+    :param policy: Ordered list of rules.
+    :type claims: Mapping
+    :param claims: Claims of the OIDC token.
+
+    :rtype: Optional[dict]
+    :return: The first matching rule or None, if no rule matches.
+    """
+    for rule in policy:
+        if all(
+            fnmatch.fnmatchcase(str(claims.get(claim, "")), pattern)
+            for claim, pattern in rule.get("claims", {}).items()
+        ):
+            return rule
+    return None
+
+
+def session_key(rule: dict, claims: Mapping) -> tuple[str, ...]:
+    """
+    Derive the session key for a rule from the claims of an OIDC token.
+
+    :type rule: dict
+    :param rule: Rule selected by `select_role()`.
+    :type claims: Mapping
+    :param claims: Claims of the OIDC token.
+
+    :rtype: tuple[str, ...]
+    :return: Session key
+    """
+    return tuple(
+        str(claims.get(claim, ""))
+        for claim in rule.get("session_key", SESSION_KEY_CLAIMS)
+    )
+
+
+def role_session_name(key: tuple[str, ...]) -> str:
+    """
+    Generate an IAM role session name from a session key.
+
+    Role session names must match [\\w+=,.@-]{2,64}. Long names are truncated
+    and suffixed with a digest of the session key to keep them distinct.
+
+    :type key: tuple[str, ...]
+    :param key: Session key
+    :rtype: str
+    :return: IAM role session name
+    """
+    name = re.sub(r"[^\w+=,.@-]", "-", "@".join(key)).ljust(2, "-")
+    if len(name) > 64:
+        digest = hashlib.sha256(name.encode()).hexdigest()[:8]
+        name = f"{name[:55]}-{digest}"
+    return name
+
+
+def assume_role(rule: dict, key: tuple[str, ...], token_string: str) -> dict:
+    """
+    Assume the IAM role of a rule.
+
+    :type rule: dict
+    :param rule: Rule selected by `select_role()`.
+    :type key: tuple[str, ...]
+    :param key: Session key
+    :type token_string: str
+    :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+    :rtype: dict
+    :return: Temporary security credentials. See: Credentials in the STS API
+      Reference.
+    """
+    sts_client = boto3.client("sts")
+    kwargs = {
+        "RoleArn": rule["role_arn"],
+        "RoleSessionName": role_session_name(key),
+        "DurationSeconds": rule.get("duration_seconds", DURATION_SECONDS),
+    }
+    if rule.get("mode", ASSUME_ROLE_WITH_WEB_IDENTITY) == ASSUME_ROLE:
+        resp = sts_client.assume_role(**kwargs)
+    else:
+        resp = sts_client.assume_role_with_web_identity(
+            WebIdentityToken=token_string, **kwargs
+        )
+    return resp["Credentials"]
+
+
+def vend_credentials(
+    cache: ExpiringCache,
+    rule: dict,
+    claims: Mapping,
+    token_string: str,
+    expiry_margin: float = EXPIRY_MARGIN,
+) -> tuple[dict, bool]:
+    """
+    Vend AWS credentials for the IAM role of a rule.
+
+    Credentials are cached until `expiry_margin` seconds before they expire.
+    See: `cache_key()`.
+
+    Credentials are returned in the format expected by the AWS CLI and SDKs
+    from a 'credential_process':
+
+      {
+        "Version": 1,
+        "AccessKeyId": "...",
+        "SecretAccessKey": "...",
+        "SessionToken": "...",
+        "Expiration": "2023-01-23T18:00:00+00:00"
+      }
+
+    See: https://docs.aws.amazon.com/cli/latest/userguide/cli-configure-sourcing-external.html
+
+    :type cache: ExpiringCache
+    :param cache: Credential cache
+    :type rule: dict
+    :param rule: Rule selected by `select_role()`.
+    :type claims: Mapping
+    :param claims: Claims of the OIDC token.
+    :type token_string: str
+    :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+    :type expiry_margin: float
+    :param expiry_margin: Number of seconds before expiry at which cached
+      credentials are no longer vended.
+
+    :rtype: tuple[dict, bool]
+    :return: The credentials and whether they were found in the cache.
+    """  # noqa
+    key = session_key(rule, claims)
+
+    def create() -> tuple[dict, float]:
+        credentials = assume_role(rule=rule, key=key, token_string=token_string)
+        expiration = credentials["Expiration"]
+        value = {
+            "Version": 1,
+            "AccessKeyId": credentials["AccessKeyId"],
+            "SecretAccessKey": credentials["SecretAccessKey"],
+            "SessionToken": credentials["SessionToken"],
+            "Expiration": expiration.isoformat(),
+        }
+        return value, expiration.timestamp() - expiry_margin
+
+    return cache.get_or_create(cache_key(rule, claims, key, token_string), create)
+
+
+def cache_key(
+    rule: dict, claims: Mapping, key: tuple[str, ...], token_string: str
+) -> tuple[str, ...]:
+    """
+    Get the key under which credentials for the IAM role of a rule are cached.
+
+    In 'assume_role_with_web_identity' mode, a cache hit would skip the trust
+    policy of the IAM role, which may depend on any claim of the OIDC token.
+    Credentials are therefore only shared by requests presenting the same
+    OIDC token. In 'assume_role' mode, credentials are shared by OIDC tokens
+    from the same issuer with the same session key.
+
+    :type rule: dict
+    :param rule: Rule selected by `select_role()`.
+    :type claims: Mapping
+    :param claims: Claims of the OIDC token.
+    :type key: tuple[str, ...]
+    :param key: Session key
+    :type token_string: str
+    :param token_string: JSON Web Token (xxxxx.yyyyy.zzzzz)
+
+    :rtype: tuple[str, ...]
+    :return: Cache key
+    """
+    if rule.get("mode", ASSUME_ROLE_WITH_WEB_IDENTITY) == ASSUME_ROLE:
+        return (rule["role_arn"], str(claims.get("iss", ""))) + key
+    digest = hashlib.sha256(token_string.encode()).hexdigest()
+    return (rule["role_arn"], digest)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI entry point.
+
+Used by production WSGI servers (ex. Gunicorn) to serve the Flask application:
+
+  $ gunicorn src.wsgi:app
+
+See: gunicorn.conf.py for the server configuration.
+
+See: https://flask.palletsprojects.com/en/2.2.x/deploying/
+"""
+from src.app import create_app, warm_up
+
+app = create_app()
+
+# Load the discovery metadata and JWKS of each trusted issuer before serving
+# requests. With 'preload_app' (see: gunicorn.conf.py), this happens once in
+# the master process, and workers are forked with warm caches.
+warm_up(app)
@@ -4,6 +4,8 @@ Flask application test fixtures.
 
 See: https://flask.palletsprojects.com/en/2.2.x/testing/
 """
+from unittest.mock import patch
+
 import pytest
 
 from src.app import create_app
@@ -28,3 +30,12 @@ def client(app):
 @pytest.fixture()
 def runner(app):
     return app.test_cli_runner()
+
+
+@pytest.fixture(autouse=True)
+def stop_patches():
+    """
+    Undo patches started (but not stopped) by a test.
+    """
+    yield
+    patch.stopall()
@@ -3,18 +3,37 @@
 Flask application tests.
 """
 import functools
+import gzip
 import importlib
+import json
 import logging
 from unittest.mock import patch
 
 from authlib.integrations import flask_oauth2
+from authlib.jose.rfc7518.rsa_key import RSAKey
 from botocore.exceptions import ClientError
-from flask import Flask
+from flask import Flask, g
 
-from src import app, oidc
+from src import app, oidc, sts
 
 from . import utils
 
+# Claims of a validated OIDC token.
+CLAIMS = {
+    "repository": "nickolashkraus/flask-oidc",
+    "repository_owner": "nickolashkraus",
+    "run_id": "3989419862",
+    "run_attempt": "1",
+    "sub": "repo:nickolashkraus/flask-oidc:ref:refs/heads/master",
+}
+
+STS_ROLE_POLICY = [
+    {
+        "role_arn": "arn:aws:iam::123456789012:role/deploy",
+        "claims": {"repository": "nickolashkraus/*"},
+    }
+]
+
 # A note for testing Flask applications:
 #
 # Typically, Flask redirects you to the canonical URL of an endpoint with a
@@ -72,11 +91,17 @@ class MockResourceProtector(flask_oauth2.ResourceProtector):
         return wrapper
 
 
-def mock_require_oidc() -> Flask:
+def mock_require_oidc(test_config: dict = None, claims: dict = None) -> Flask:
     """
     Mock 'require_oidc' decorator and return new Flask application.
 
     See: src/app.py for require_oidc.
+
+    :type test_config: dict
+    :param test_config: Configuration for the Flask application.
+    :type claims: dict
+    :param claims: Claims made available to the application context via the
+      'g' object (g.actions_claims), as if the OIDC token had been validated.
     """
     # Patch authlib `ResourceProtector` object with `MockResourceProtector`
     # object.
@@ -86,8 +111,14 @@ def mock_require_oidc() -> Flask:
     importlib.reload(app)
     # Call application factory function to generate a new application with the
     # mocked 'require_oidc' decorator.
-    mock_app = app.create_app()
+    mock_app = app.create_app(test_config)
     mock_app.testing = True
+    if claims is not None:
+
+        @mock_app.before_request
+        def set_actions_claims():
+            g.actions_claims = claims
+
     return mock_app
 
 
@@ -196,6 +227,32 @@ def test_auth_401_3():
         assert resp.status_code == 401
 
 
+def test_create_app_oidc_issuers():
+    """
+    A validator (and JWKS cache) is configured for each trusted issuer.
+    """
+    # Reload the 'app' module, so that a new (unmocked) 'require_oidc'
+    # decorator is created.
+    importlib.reload(app)
+    ghes = "https://github.example.com/_services/token"
+    mock_app = app.create_app(
+        {
+            "OIDC_ISSUERS": [
+                oidc.GITHUB_OPENID_ISSUER_URI,
+                {"issuer": ghes, "jwks_ttl": 60},
+            ]
+        }
+    )
+    validators = app.require_oidc.get_token_validator("bearer").validators
+    assert mock_app.config["OIDC_ISSUERS"][1]["issuer"] == ghes
+    assert list(validators) == [oidc.GITHUB_OPENID_ISSUER_URI, ghes]
+    assert validators[oidc.GITHUB_OPENID_ISSUER_URI].public_key.ttl == oidc.JWKS_TTL
+    assert validators[ghes].public_key.ttl == 60
+    assert validators[ghes].claims_options["iss"]["value"] == ghes
+    # The fast RS256 path is opt-in.
+    assert not any(v.fast_verify for v in validators.values())
+
+
 def test_auth_200():
     """
     Status: 200 OK
@@ -291,3 +348,380 @@ def test_presigned_200():
         )
         assert b"https://bucket.s3.amazonaws.com" in resp.data
         assert resp.status_code == 200
+
+
+def test_presigned_200_audit(tmp_path):
+    """
+    Status: 200 OK
+
+    Presigned POST requests are recorded in the audit trail ('AUDIT_URL').
+    """
+    mock_app = mock_require_oidc(
+        test_config={"AUDIT_URL": f"file://{tmp_path}"}, claims=CLAIMS
+    )
+    patch.object(app, "generate_presigned_post").start().return_value = {}
+    data = {"bucket": "bucket", "key": "key"}
+    with mock_app.test_client() as client:
+        resp = client.post("/v1/presigned", json=data)
+        assert resp.status_code == 200
+    mock_app.extensions["audit"].close()
+    (segment,) = tmp_path.glob("*/*/*/*.jsonl.gz")
+    (record,) = [
+        json.loads(x) for x in gzip.decompress(segment.read_bytes()).splitlines()
+    ]
+    assert record["event"] == "presigned"
+    assert (record["bucket"], record["key"]) == ("bucket", "key")
+    assert record["claims"]["run_id"] == CLAIMS["run_id"]
+
+
+def test_credentials_403():
+    """
+    Status: 403 FORBIDDEN
+    Error: Forbidden: No IAM role permitted for OIDC token
+
+    Mocks the authlib library `ResourceProtector` in order to circumvent OIDC
+    authentication flow.
+    """
+    mock_app = mock_require_oidc(
+        test_config={"STS_ROLE_POLICY": STS_ROLE_POLICY},
+        claims=dict(CLAIMS, repository="octocat/hello-world"),
+    )
+    with mock_app.test_client() as client:
+        resp = client.post("/v1/credentials", headers={"Authorization": "Bearer 1337"})
+        assert b"Forbidden: No IAM role permitted for OIDC token" in resp.data
+        assert resp.status_code == 403
+
+
+def test_credentials_500():
+    """
+    Status: 500 INTERNAL SERVER ERROR
+    Error: Internal Server Error: An error occurred assuming the IAM role.
+
+    Mocks the authlib library `ResourceProtector` in order to circumvent OIDC
+    authentication flow.
+    """
+    mock_app = mock_require_oidc(
+        test_config={"STS_ROLE_POLICY": STS_ROLE_POLICY}, claims=CLAIMS
+    )
+    mock_assume_role = patch.object(sts, "assume_role").start()
+    mock_assume_role.side_effect = ClientError(
+        error_response={"Error": {"Code": "AccessDenied"}}, operation_name=""
+    )
+    with mock_app.test_client() as client:
+        resp = client.post("/v1/credentials", headers={"Authorization": "Bearer 1337"})
+        assert (
+            b"Internal Server Error: An error occurred assuming the IAM role"
+        ) in resp.data
+        assert resp.status_code == 500
+
+
+def test_credentials_200():
+    """
+    Status: 200 OK
+
+    Credentials are vended from the cache for jobs in the same workflow run.
+    The OIDC token is read from the Authorization header as by authlib (ex.
+    extra whitespace is ignored).
+
+    Mocks the authlib library `ResourceProtector` in order to circumvent OIDC
+    authentication flow. Uses a local stand-in for AWS STS.
+    """
+    mock_app = mock_require_oidc(
+        test_config={"STS_ROLE_POLICY": STS_ROLE_POLICY}, claims=CLAIMS
+    )
+    sts_client = utils.MockSTSClient()
+    mock_boto3 = patch.object(sts, "boto3").start()
+    mock_boto3.client.return_value = sts_client
+    with mock_app.test_client() as client:
+        for authorization in ["Bearer 1337", "Bearer  1337", "bearer \t1337"]:
+            resp = client.post(
+                "/v1/credentials", headers={"Authorization": authorization}
+            )
+            assert resp.get_json()["AccessKeyId"] == "ASIA1"
+            assert resp.headers["Cache-Control"] == "no-store"
+            assert resp.status_code == 200
+    assert len(sts_client.calls) == 1
+    method, kwargs = sts_client.calls[0]
+    assert method == "assume_role_with_web_identity"
+    assert kwargs["WebIdentityToken"] == "1337"
+    assert kwargs["RoleArn"] == STS_ROLE_POLICY[0]["role_arn"]
+
+
+def test_presigned_200_cached():
+    """
+    Status: 200 OK
+
+    Presigned POST requests are returned from the cache for the same caller,
+    bucket, key, and tagging.
+
+    Mocks the authlib library `ResourceProtector` in order to circumvent OIDC
+    authentication flow.
+    """
+    mock_app = mock_require_oidc(
+        test_config={"PRESIGNED_CACHE_ENABLED": True}, claims=CLAIMS
+    )
+    mock_generate_presigned_post = patch.object(app, "generate_presigned_post").start()
+    mock_generate_presigned_post.return_value = {
+        "url": "https://bucket.s3.amazonaws.com",
+        "fields": {"key": "key", "signature": "signature"},
+    }
+    with mock_app.test_client() as client:
+        for x_cache in ["MISS", "HIT", "HIT"]:
+            resp = client.post(
+                "/v1/presigned",
+                json={"bucket": "bucket", "key": "key"},
+                headers={"Authorization": "Bearer 1337"},
+            )
+            assert b"https://bucket.s3.amazonaws.com" in resp.data
+            assert resp.headers["X-Cache"] == x_cache
+            assert resp.headers["Age"] == "0"
+            assert resp.status_code == 200
+        assert mock_generate_presigned_post.call_count == 1
+        resp = client.post(
+            "/v1/presigned",
+            json={"bucket": "bucket", "key": "other"},
+            headers={"Authorization": "Bearer 1337"},
+        )
+        assert resp.headers["X-Cache"] == "MISS"
+        assert mock_generate_presigned_post.call_count == 2
+
+
+def test_presigned_200_cached_min_remaining():
+    """
+    Status: 200 OK
+
+    Presigned POST requests are not returned from the cache once they have
+    less than 'PRESIGNED_CACHE_MIN_REMAINING' of their lifetime left.
+
+    Mocks the authlib library `ResourceProtector` in order to circumvent OIDC
+    authentication flow.
+    """
+    mock_app = mock_require_oidc(
+        test_config={
+            "PRESIGNED_CACHE_ENABLED": True,
+            "PRESIGNED_CACHE_MIN_REMAINING": 1,
+        },
+        claims=CLAIMS,
+    )
+    mock_generate_presigned_post = patch.object(app, "generate_presigned_post").start()
+    mock_generate_presigned_post.return_value = {"url": "url", "fields": {}}
+    with mock_app.test_client() as client:
+        for _ in range(2):
+            resp = client.post(
+                "/v1/presigned",
+                json={"bucket": "bucket", "key": "key"},
+                headers={"Authorization": "Bearer 1337"},
+            )
+            assert resp.headers["X-Cache"] == "MISS"
+    assert mock_generate_presigned_post.call_count == 2
+
+
+def test_presigned_429():
+    """
+    Status: 429 TOO MANY REQUESTS
+    Error: Too Many Requests: Rate limit exceeded
+
+    Mocks the authlib library `ResourceProtector` in order to circumvent OIDC
+    authentication flow.
+    """
+    mock_app = mock_require_oidc(
+        test_config={
+            "RATE_LIMITS": [{"claim": "repository", "limit": 1, "period": 60}]
+        },
+        claims=CLAIMS,
+    )
+    mock_generate_presigned_post = patch.object(app, "generate_presigned_post").start()
+    mock_generate_presigned_post.return_value = {"url": "url", "fields": {}}
+    data = {"bucket": "bucket", "key": "key"}
+    with mock_app.test_client() as client:
+        resp = client.post(
+            "/v1/presigned", json=data, headers={"Authorization": "Bearer 1337"}
+        )
+        assert resp.status_code == 200
+        resp = client.post(
+            "/v1/presigned", json=data, headers={"Authorization": "Bearer 1337"}
+        )
+        assert (
+            b"Too Many Requests: Rate limit exceeded for 'repository': "
+            b"nickolashkraus/flask-oidc"
+        ) in resp.data
+        assert resp.headers["Retry-After"] == "60"
+        assert resp.status_code == 429
+    assert mock_generate_presigned_post.call_count == 1
+
+
+def mock_private_key() -> tuple[Flask, RSAKey]:
+    """
+    Generate a private key, mock the public key, and return new Flask
+    application and the private key for signing JWTs.
+    """
+    private_key = utils.generate_private_key()
+    mock_public_key = patch.object(oidc, "fetch_github_oidc_public_key").start()
+    mock_public_key.return_value = private_key
+    mock_app = app.create_app()
+    mock_app.testing = True
+    return mock_app, private_key
+
+
+def test_verify_200():
+    """
+    Status: 200 OK
+    """
+    mock_app, private_key = mock_private_key()
+    token = utils.generate_jwt(private_key)
+    with mock_app.test_client() as client:
+        resp = client.post("/v1/verify", json={"token": token})
+        assert resp.get_json()["valid"] is True
+        assert resp.get_json()["claims"]["repository"] == "nickolashkraus/flask-oidc"
+        assert resp.status_code == 200
+        resp = client.post(
+            "/v1/verify", json={"token": utils.generate_jwt(private_key, exp=1)}
+        )
+        assert resp.get_json() == {"valid": False}
+        assert resp.status_code == 200
+
+
+def test_verify_400():
+    """
+    Status: 400 BAD REQUEST
+    Error: Bad Request: OIDC token not provided in request
+    """
+    mock_app, _ = mock_private_key()
+    with mock_app.test_client() as client:
+        # Body is not a JSON object (ex. a list).
+        for body in [{}, {"token": 1}, [1], "x", None]:
+            resp = client.post("/v1/verify", json=body)
+            assert b"Bad Request: OIDC token not provided in request" in resp.data
+            assert resp.status_code == 400
+
+
+def test_verify_batch_200():
+    """
+    Status: 200 OK
+
+    The claims of valid OIDC tokens are cached and shared between requests.
+    """
+    mock_app, private_key = mock_private_key()
+    tokens = [
+        utils.generate_jwt(private_key),
+        utils.generate_jwt(private_key, exp=1),
+        utils.read_jwt("data/jwts/bad.txt"),
+        "bad",
+    ]
+    with mock_app.test_client() as client:
+        resp = client.post("/v1/verify/batch", json={"tokens": tokens})
+        results = resp.get_json()["results"]
+        assert [x["valid"] for x in results] == [True, False, False, False]
+        assert resp.status_code == 200
+    validator = mock_app.extensions["oidc_validator"]
+    assert validator.cache.get(tokens[0]).repository == "nickolashkraus/flask-oidc"
+    assert len(validator.cache) == 1
+
+
+def test_verify_batch_400():
+    """
+    Status: 400 BAD REQUEST
+    Error: Bad Request: Too many OIDC tokens in request
+    """
+    mock_app, _ = mock_private_key()
+    mock_app.config["VERIFY_BATCH_MAX_TOKENS"] = 1
+    with mock_app.test_client() as client:
+        resp = client.post("/v1/verify/batch", json={"tokens": ["a", "b"]})
+        assert b"Bad Request: Too many OIDC tokens in request (max: 1)" in resp.data
+        assert resp.status_code == 400
+        # Body is not a JSON object (ex. a string).
+        for body in [{"tokens": "a"}, {"tokens": [1]}, ["a"], "x", None]:
+            resp = client.post("/v1/verify/batch", json=body)
+            assert b"Bad Request: OIDC tokens not provided in request" in resp.data
+            assert resp.status_code == 400
+
+
+def test_ext_authz_200():
+    """
+    Status: 200 OK
+
+    Selected claims are returned as headers.
+    """
+    mock_app, private_key = mock_private_key()
+    token = utils.generate_jwt(private_key)
+    with mock_app.test_client() as client:
+        for authorization in [f"Bearer {token}", f"Bearer  {token}"]:
+            resp = client.post(
+                "/v1/ext_authz/original/path",
+                headers={"Authorization": authorization},
+            )
+            assert resp.headers["X-Actions-Repository"] == "nickolashkraus/flask-oidc"
+            assert resp.headers["X-Actions-Repository-Owner"] == "nickolashkraus"
+            assert resp.headers["X-Actions-Run-Id"] == "3989419862"
+            assert "X-Actions-Jti" not in resp.headers
+            assert resp.status_code == 200
+
+
+def test_ext_authz_401():
+    """
+    Status: 401 UNAUTHORIZED
+    Error: Unauthorized: Invalid or missing OIDC token
+    """
+    mock_app, private_key = mock_private_key()
+    token = utils.generate_jwt(private_key, exp=1)
+    with mock_app.test_client() as client:
+        for headers in [
+            {},
+            {"Authorization": f"Bearer {token}"},
+            {"Authorization": "Bearer "},
+            {"Authorization": f"Basic {token}"},
+        ]:
+            resp = client.get("/v1/ext_authz", headers=headers)
+            assert b"Unauthorized: Invalid or missing OIDC token" in resp.data
+            assert resp.headers["WWW-Authenticate"] == 'Bearer error="invalid_token"'
+            assert resp.status_code == 401
+
+
+def test_healthz_200():
+    """
+    Status: 200 OK
+    """
+    mock_app = app.create_app()
+    with mock_app.test_client() as client:
+        resp = client.get("/healthz")
+        assert resp.get_json() == {"status": "ok"}
+        assert resp.status_code == 200
+
+
+def test_readyz_503():
+    """
+    Status: 503 SERVICE UNAVAILABLE
+
+    The JWKS has not been loaded. Polling the endpoint warms the JWKS cache.
+    """
+    mock_warm = patch.object(oidc.JWKSCache, "warm").start()
+    mock_app = app.create_app()
+    with mock_app.test_client() as client:
+        resp = client.get("/readyz")
+        assert resp.get_json()["ready"] is False
+        status = resp.get_json()["issuers"][oidc.GITHUB_OPENID_ISSUER_URI]
+        assert (status["ready"], status["discovery"], status["keys"]) == (
+            False,
+            False,
+            0,
+        )
+        assert resp.status_code == 503
+    mock_warm.assert_called_once_with()
+
+
+def test_readyz_200():
+    """
+    Status: 200 OK
+    """
+    mock_app = app.create_app()
+    issuer = oidc.GITHUB_OPENID_ISSUER_URI
+    oauth = mock_app.extensions["authlib.integrations.flask_client"]
+    oauth.create_client(issuer).server_metadata["_loaded_at"] = 0
+    jwks = mock_app.extensions["oidc_validator"].validators[issuer].public_key
+    jwks.fetch_jwk_set = utils.read_jwk_set
+    app.warm_up(mock_app)
+    with mock_app.test_client() as client:
+        resp = client.get("/readyz")
+        assert resp.get_json()["ready"] is True
+        assert resp.get_json()["issuers"][issuer]["keys"] == 1
+        assert resp.status_code == 200
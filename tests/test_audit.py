@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Audit trail tests.
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src import audit
+from src.claims import ActionsClaims
+
+CLAIMS = ActionsClaims(
+    {
+        "repository": "nickolashkraus/flask-oidc",
+        "run_id": "3989419862",
+        "sub": "repo:nickolashkraus/flask-oidc:ref:refs/heads/master",
+    }
+)
+
+
+def read_segment(data: bytes) -> list[dict]:
+    return [json.loads(x) for x in gzip.decompress(data).splitlines()]
+
+
+class FileSink(unittest.TestCase):
+    def setUp(self):
+        super(FileSink, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_write(self):
+        sink = audit.FileSink(self.directory)
+        sink.write("2023/01/23/180000-host-1-000001.jsonl.gz", b"data")
+        path = os.path.join(self.directory, "2023/01/23")
+        self.assertEqual(["180000-host-1-000001.jsonl.gz"], os.listdir(path))
+
+
+class S3Sink(unittest.TestCase):
+    def test_write(self):
+        mock_client = patch.object(audit.boto3, "client").start()
+        self.addCleanup(patch.stopall)
+        audit.S3Sink("bucket", "audit/").write("a.jsonl.gz", b"data")
+        _, kwargs = mock_client.return_value.put_object.call_args
+        self.assertEqual("bucket", kwargs["Bucket"])
+        self.assertEqual("audit/a.jsonl.gz", kwargs["Key"])
+        self.assertEqual(b"data", kwargs["Body"])
+
+
+class SinkFromURL(unittest.TestCase):
+    def test_sink_from_url(self):
+        sink = audit.sink_from_url("file:///var/log/audit")
+        self.assertIsInstance(sink, audit.FileSink)
+        self.assertEqual("/var/log/audit", sink.directory)
+        sink = audit.sink_from_url("s3://bucket/audit/")
+        self.assertIsInstance(sink, audit.S3Sink)
+        self.assertEqual(("bucket", "audit/"), (sink.bucket, sink.prefix))
+        with self.assertRaises(ValueError):
+            audit.sink_from_url("ftp://example.com")
+
+
+class AuditLog(unittest.TestCase):
+    def setUp(self):
+        super(AuditLog, self).setUp()
+        self.addCleanup(patch.stopall)
+        self.sink = MagicMock()
+
+    def test_record(self):
+        a = audit.AuditLog(self.sink, segment_max_records=2, flush_interval=60)
+        self.assertTrue(a.record("presigned", CLAIMS, bucket="b", key="k"))
+        self.assertTrue(a.record("authenticate", CLAIMS, path="/v1/auth"))
+        a.close()
+        # Segment is written once it holds 'segment_max_records' records.
+        self.sink.write.assert_called_once()
+        name, data = self.sink.write.call_args[0]
+        self.assertTrue(name.endswith("-000001.jsonl.gz"))
+        records = read_segment(data)
+        self.assertEqual(["presigned", "authenticate"], [x["event"] for x in records])
+        self.assertEqual("b", records[0]["bucket"])
+        self.assertEqual(
+            {
+                "repository": "nickolashkraus/flask-oidc",
+                "run_id": "3989419862",
+                "sub": "repo:nickolashkraus/flask-oidc:ref:refs/heads/master",
+            },
+            records[0]["claims"],
+        )
+        self.assertEqual(2, a.written)
+
+    def test_record_flush_interval(self):
+        written = threading.Event()
+        self.sink.write.side_effect = lambda *args: written.set()
+        a = audit.AuditLog(self.sink, flush_interval=0.01)
+        a.record("authenticate", CLAIMS)
+        self.assertTrue(written.wait(5))
+        a.close()
+        self.assertEqual(1, a.written)
+
+    def test_record_close(self):
+        a = audit.AuditLog(self.sink, flush_interval=60)
+        a.record("authenticate", CLAIMS)
+        self.sink.write.assert_not_called()
+        # Queued records are written on close.
+        a.close()
+        self.sink.write.assert_called_once()
+
+    def test_record_overflow_drop(self):
+        a = audit.AuditLog(self.sink, queue_max_records=1, flush_interval=60)
+        # Stall the writer thread.
+        block = threading.Event()
+        patch.object(a, "_run", lambda q: block.wait()).start()
+        self.assertTrue(a.record("authenticate", CLAIMS))
+        self.assertFalse(a.record("authenticate", CLAIMS))
+        self.assertEqual(1, a.dropped)
+        block.set()
+        a.close(timeout=0)
+
+    def test_record_overflow_block(self):
+        a = audit.AuditLog(
+            self.sink,
+            queue_max_records=1,
+            flush_interval=60,
+            overflow=audit.BLOCK,
+            block_timeout=0.01,
+        )
+        block = threading.Event()
+        patch.object(a, "_run", lambda q: block.wait()).start()
+        self.assertTrue(a.record("authenticate", CLAIMS))
+        self.assertFalse(a.record("authenticate", CLAIMS))
+        self.assertEqual(1, a.dropped)
+        block.set()
+        a.close(timeout=0)
+
+    def test_write_retry(self):
+        patch.object(audit, "WRITE_RETRY_DELAY", 0).start()
+        self.sink.write.side_effect = [OSError("unavailable"), None]
+        a = audit.AuditLog(self.sink, flush_interval=60)
+        a.record("authenticate", CLAIMS)
+        a.close()
+        self.assertEqual(2, self.sink.write.call_count)
+        self.assertEqual((1, 1, 0), (a.written, a.failed_writes, a.dropped))
+
+    def test_write_dropped(self):
+        patch.object(audit, "WRITE_RETRY_DELAY", 0).start()
+        self.sink.write.side_effect = OSError("unavailable")
+        a = audit.AuditLog(self.sink, flush_interval=60)
+        a.record("authenticate", CLAIMS)
+        a.close()
+        self.assertEqual(audit.WRITE_RETRIES + 1, self.sink.write.call_count)
+        self.assertEqual((0, 1), (a.written, a.dropped))
+
+    def test_overflow_invalid(self):
+        with self.assertRaises(ValueError):
+            audit.AuditLog(self.sink, overflow="ignore")
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory caching tests.
+"""
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from src import cache
+
+
+class ExpiringCache(unittest.TestCase):
+    def setUp(self):
+        super(ExpiringCache, self).setUp()
+        self.c = cache.ExpiringCache(max_entries=2)
+
+    def test_get(self):
+        self.c.set("a", 1, time.time() + 60)
+        self.assertEqual(1, self.c.get("a"))
+        self.assertIsNone(self.c.get("b"))
+
+    def test_get_expired(self):
+        self.c.set("a", 1, time.time() - 1)
+        self.assertIsNone(self.c.get("a"))
+        self.assertEqual(0, len(self.c))
+
+    def test_set_evicts_least_recently_used(self):
+        self.c.set("a", 1, time.time() + 60)
+        self.c.set("b", 2, time.time() + 60)
+        self.c.get("a")
+        self.c.set("c", 3, time.time() + 60)
+        self.assertEqual(1, self.c.get("a"))
+        self.assertIsNone(self.c.get("b"))
+        self.assertEqual(3, self.c.get("c"))
+
+    def test_get_or_create(self):
+        create = MagicMock(return_value=(1, time.time() + 60))
+        self.assertEqual((1, False), self.c.get_or_create("a", create))
+        self.assertEqual((1, True), self.c.get_or_create("a", create))
+        create.assert_called_once()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+GitHub Actions OIDC token claims tests.
+"""
+import pickle
+import time
+import unittest
+
+from src import claims
+
+CLAIMS = {
+    "iss": "https://token.actions.githubusercontent.com",
+    "sub": "repo:nickolashkraus/flask-oidc:ref:refs/heads/master",
+    "exp": 1674498978,
+    "iat": 1674498678,
+    "ref": "refs/heads/master",
+    "ref_type": "branch",
+    "repository": "nickolashkraus/flask-oidc",
+    "repository_owner": "nickolashkraus",
+    "run_id": "3989419862",
+    "runner_environment": "github-hosted",
+}
+
+
+class ActionsClaims(unittest.TestCase):
+    def setUp(self):
+        super(ActionsClaims, self).setUp()
+        self.c = claims.ActionsClaims(CLAIMS)
+
+    def test_attributes(self):
+        self.assertEqual("nickolashkraus/flask-oidc", self.c.repository)
+        self.assertEqual(1674498978, self.c.exp)
+        # Claims not present in the OIDC token are None.
+        self.assertIsNone(self.c.environment)
+
+    def test_derived_values(self):
+        self.assertEqual("master", self.c.branch)
+        self.assertIsNone(self.c.tag)
+        c = claims.ActionsClaims(dict(CLAIMS, ref="refs/tags/v1.0.0"))
+        self.assertIsNone(c.branch)
+        self.assertEqual("v1.0.0", c.tag)
+
+    def test_interned(self):
+        # Equal values of interned claims are the same object.
+        other = claims.ActionsClaims({"repository": "nickolashkraus/" + "flask-oidc"})
+        self.assertIs(self.c.repository, other.repository)
+
+    def test_read_only(self):
+        with self.assertRaises(AttributeError):
+            self.c.repository = "octocat/hello-world"
+        with self.assertRaises(AttributeError):
+            self.c.foo = "bar"
+        with self.assertRaises(TypeError):
+            self.c["repository"] = "octocat/hello-world"
+
+    def test_mapping(self):
+        self.assertEqual(CLAIMS, dict(self.c))
+        self.assertEqual(len(CLAIMS), len(self.c))
+        self.assertEqual("github-hosted", self.c["runner_environment"])
+        self.assertEqual("nickolashkraus/flask-oidc", self.c.get("repository"))
+        self.assertIsNone(self.c.get("environment"))
+        self.assertNotIn("environment", self.c)
+        with self.assertRaises(KeyError):
+            self.c["environment"]
+
+    def test_pickle(self):
+        self.assertEqual(self.c, pickle.loads(pickle.dumps(self.c)))
+
+    def test_token(self):
+        self.assertTrue(self.c.is_expired())
+        self.assertFalse(self.c.is_revoked())
+        self.assertIsNone(self.c.get_scope())
+        self.assertEqual(300, self.c.get_expires_in())
+        c = claims.ActionsClaims(dict(CLAIMS, exp=int(time.time()) + 60))
+        self.assertFalse(c.is_expired())
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk JWT verification (scripts/decode.py) tests.
+"""
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from authlib.jose import jwt
+
+from scripts import decode
+from tests import utils
+
+
+def encode(x: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(x).encode()).rstrip(b"=").decode()
+
+
+class ReadTokens(unittest.TestCase):
+    def test_read_tokens(self):
+        f = io.StringIO("a.b.c\n\n  d.e.f  \n")
+        self.assertEqual(
+            [(1, "a.b.c"), (3, "d.e.f")], list(decode.read_tokens(f, "token"))
+        )
+
+    def test_read_tokens_jsonl(self):
+        f = io.StringIO('{"token": "a.b.c"}\n{"jwt": "d.e.f", "token": "x"}\n')
+        self.assertEqual([(1, "a.b.c"), (2, "x")], list(decode.read_tokens(f, "token")))
+        f = io.StringIO('{"jwt": "d.e.f"}\n')
+        self.assertEqual([(1, "d.e.f")], list(decode.read_tokens(f, "jwt")))
+
+    def test_read_tokens_invalid_line(self):
+        f = io.StringIO('{"token": \n{"jwt": "a.b.c"}\n{"token": []\n')
+        self.assertEqual(
+            [(1, None), (2, None), (3, None)], list(decode.read_tokens(f, "token"))
+        )
+
+    def test_read_tokens_invalid_token(self):
+        # Valid JSON, but the token is not a string.
+        f = io.StringIO('{"token": 5}\n{"token": ["x"]}\n{"token": null}\n')
+        self.assertEqual(
+            [(1, None), (2, None), (3, None)], list(decode.read_tokens(f, "token"))
+        )
+
+
+class Verify(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key = utils.generate_private_key()
+        cls.jwk_set = {"keys": [cls.private_key.as_dict(is_private=False)]}
+
+    def setUp(self):
+        super(Verify, self).setUp()
+        decode.init_worker(self.jwk_set, decode.oidc.GITHUB_OPENID_ISSUER_URI, None)
+
+    def assertError(self, error, token_string):
+        result = decode.verify(token_string)
+        self.assertFalse(result["valid"])
+        self.assertEqual(error, result["error"])
+
+    def test_verify(self):
+        result = decode.verify(utils.generate_jwt(self.private_key))
+        self.assertTrue(result["valid"])
+        self.assertIsNone(result["error"])
+        self.assertEqual("test", result["kid"])
+        self.assertEqual(decode.oidc.GITHUB_OPENID_ISSUER_URI, result["iss"])
+
+    def test_verify_invalid(self):
+        self.assertError("expired_token", utils.generate_jwt(self.private_key, exp=1))
+        self.assertError(
+            "invalid_claim", utils.generate_jwt(self.private_key, iss="https://x")
+        )
+        self.assertError("bad_signature", utils.generate_jwt(self.private_key)[:-4])
+        self.assertError(
+            "unknown_kid", utils.generate_jwt(utils.generate_private_key(kid="k2"))
+        )
+
+    def test_verify_malformed(self):
+        for token_string in ["", "abc", "a.b.c", "é.é.é", "{}.{}.{}"]:
+            with self.subTest(token_string=token_string):
+                self.assertError("decode_error", token_string)
+
+    def test_verify_unsupported_algorithm(self):
+        payload = {"iss": decode.oidc.GITHUB_OPENID_ISSUER_URI}
+        # Unsigned JWT (no 'kid').
+        self.assertError(
+            "unsupported_algorithm", f"{encode({'alg': 'none'})}.{encode(payload)}."
+        )
+        # HMAC JWT using a 'kid' in the JWKS.
+        header = {"alg": "HS256", "kid": "test"}
+        self.assertError(
+            "unsupported_algorithm", jwt.encode(header, payload, "secret").decode()
+        )
+
+    def test_verify_error(self):
+        with patch.object(decode.jwt, "decode", side_effect=KeyError(0)):
+            self.assertError("verification_error", utils.generate_jwt(self.private_key))
+
+
+class BulkVerify(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key = utils.generate_private_key()
+        cls.jwk_set = {"keys": [cls.private_key.as_dict(is_private=False)]}
+
+    def test_verify_batch_error(self):
+        # A token that is not a string (ex. passed by a caller other than
+        # `read_tokens()`) does not fail the batch.
+        decode.init_worker(self.jwk_set, None, None)
+        results = [json.loads(x) for x in decode.verify_batch([(1, 5), (2, "abc")])]
+        self.assertEqual(
+            ["verification_error", "decode_error"], [x["error"] for x in results]
+        )
+
+    def test_bulk_verify(self):
+        # Several batches per worker process, so results of later batches may
+        # be ready before those of earlier batches.
+        patch.object(decode, "BATCH_SIZE", 3).start()
+        valid = utils.generate_jwt(self.private_key)
+        hostile = jwt.encode({"alg": "HS256", "kid": "test"}, {}, "secret").decode()
+        tokens = [(n, [valid, hostile, None, "abc"][n % 4]) for n in range(1, 51)]
+        out = io.StringIO()
+        count = decode.bulk_verify(tokens, out, self.jwk_set, workers=2)
+        results = [json.loads(x) for x in out.getvalue().splitlines()]
+        self.assertEqual(50, count)
+        self.assertEqual(list(range(1, 51)), [x["line"] for x in results])
+        self.assertEqual(
+            [None, "unsupported_algorithm", "invalid_line", "decode_error"],
+            [x["error"] for x in results[3:7]],
+        )
+        self.assertEqual(12, sum(x["valid"] for x in results))
+
+
+class Main(unittest.TestCase):
+    def setUp(self):
+        super(Main, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_main(self):
+        private_key = utils.generate_private_key()
+        # Local JWKS snapshot.
+        jwks = os.path.join(self.directory, "jwks.json")
+        with open(jwks, "w") as f:
+            json.dump({"keys": [private_key.as_dict(is_private=False)]}, f)
+        tokens = os.path.join(self.directory, "tokens.jsonl")
+        with open(tokens, "w") as f:
+            f.write(json.dumps({"token": utils.generate_jwt(private_key)}) + "\n")
+            f.write("not json\n")
+            f.write(json.dumps({"token": ["x"]}) + "\n")
+            f.write(json.dumps({"token": utils.generate_jwt(private_key, exp=1)}))
+        out = patch.object(decode.sys, "stdout", io.StringIO()).start()
+        decode.main(["--jwks", jwks, "--workers", "1", tokens])
+        results = [json.loads(x) for x in out.getvalue().splitlines()]
+        self.assertEqual(
+            [
+                (1, True, None),
+                (2, False, "decode_error"),
+                (3, False, "invalid_line"),
+                (4, False, "expired_token"),
+            ],
+            [(x["line"], x["valid"], x["error"]) for x in results],
+        )
@@ -2,10 +2,20 @@
 """
 OIDC authentication tests.
 """
+import base64
+import json
+import time
 import unittest
-from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from authlib.jose import jwt
+from authlib.jose.errors import InvalidTokenError
+from flask import Flask, g
 
 from src import oidc
+from src.cache import ExpiringCache
+from src.claims import ActionsClaims
 
 from . import utils
 
@@ -31,3 +41,306 @@ class GitHubActionsOIDCTokenValidator(unittest.TestCase):
 
     def test_fetch_github_oidc_public_key(self):
         pass
+
+    def test_authenticate_token_claims(self):
+        private_key = utils.generate_private_key()
+        self.g.public_key = private_key
+        with Flask(__name__).app_context():
+            result = self.g.authenticate_token(utils.generate_jwt(private_key))
+            self.assertIsInstance(result, ActionsClaims)
+            self.assertIs(result, g.actions_claims)
+            self.assertEqual("nickolashkraus/flask-oidc", result.repository)
+            self.assertEqual("output-token", result.branch)
+
+
+class VerifyRS256(unittest.TestCase):
+    """
+    The fast (cryptography) and authlib verification paths must agree.
+    """
+
+    def setUp(self):
+        super(VerifyRS256, self).setUp()
+        self.addCleanup(patch.stopall)
+        self.private_key = utils.generate_private_key(kid="k1")
+        jwk_set = {"keys": [self.private_key.as_dict(is_private=False)]}
+        self.fast, self.slow = [
+            oidc.GitHubActionsOIDCTokenValidator(
+                public_key=oidc.JWKSCache(fetch_jwk_set=lambda: jwk_set),
+                issuer=oidc.GITHUB_OPENID_ISSUER_URI,
+                fast_verify=fast_verify,
+            )
+            for fast_verify in (True, False)
+        ]
+
+    def assertParity(self, token, valid):
+        fast, slow = self.fast.verify_token(token), self.slow.verify_token(token)
+        self.assertEqual(slow, fast)
+        self.assertEqual(valid, fast is not None)
+
+    def test_parity_data(self):
+        # Tokens in tests/data, verified with the public key in PEM format.
+        self.fast.public_key = self.slow.public_key = utils.read_public_key()
+        for filename in ["bad.txt", "default.txt", "expired.txt"]:
+            token = utils.read_jwt(f"data/jwts/{filename}")
+            # Verified by the fast path (not left to authlib).
+            self.assertIsNot(NotImplemented, self.fast.verify_rs256(token))
+            self.assertParity(token, valid=False)
+
+    def test_parity_valid(self):
+        token = utils.generate_jwt(self.private_key)
+        self.assertIsNot(NotImplemented, self.fast.verify_rs256(token))
+        self.assertParity(token, valid=True)
+
+    def test_parity_invalid(self):
+        other_key = utils.generate_private_key(kid="k1")
+        header, payload, signature = utils.generate_jwt(self.private_key).split(".")
+        _, other_payload, _ = utils.generate_jwt(self.private_key, sub="x").split(".")
+        list_kid = base64.urlsafe_b64encode(
+            json.dumps({"alg": "RS256", "typ": "JWT", "kid": ["k1"]}).encode()
+        ).decode()
+        for token in [
+            # expired
+            utils.generate_jwt(self.private_key, exp=1),
+            # wrong issuer
+            utils.generate_jwt(self.private_key, iss="https://jwt.io"),
+            # missing essential claim
+            utils.generate_jwt(self.private_key, repository=""),
+            # signed with another key
+            utils.generate_jwt(other_key),
+            # unknown 'kid'
+            utils.generate_jwt(utils.generate_private_key(kid="k2")),
+            # non-string 'kid'
+            f"{list_kid}.{payload}.{signature}",
+            # tampered payload
+            f"{header}.{other_payload}.{signature}",
+            # malformed
+            f"{header}.{payload}",
+            f"{header}.{payload}.!!!",
+            "bad",
+        ]:
+            self.assertParity(token, valid=False)
+        # key intended for encryption ('use': 'enc')
+        jwk_set = {
+            "keys": [dict(self.private_key.as_dict(is_private=False), use="enc")]
+        }
+        self.fast.public_key = self.slow.public_key = oidc.JWKSCache(
+            fetch_jwk_set=lambda: jwk_set
+        )
+        token = utils.generate_jwt(self.private_key)
+        self.assertIsNot(NotImplemented, self.fast.verify_rs256(token))
+        self.assertParity(token, valid=False)
+
+    def test_fallback(self):
+        # JWTs with other algorithms or header parameters are left to authlib.
+        token = jwt.encode(
+            {"alg": "HS256"}, {"iss": oidc.GITHUB_OPENID_ISSUER_URI}, "secret"
+        ).decode()
+        self.assertIs(NotImplemented, self.fast.verify_rs256(token))
+        self.assertParity(token, valid=False)
+        token = jwt.encode(
+            {"alg": "RS256", "kid": "k1", "crit": ["exp"]}, {}, self.private_key
+        ).decode()
+        self.assertIs(NotImplemented, self.fast.verify_rs256(token))
+        self.assertParity(token, valid=False)
+
+
+class MultiIssuerOIDCTokenValidator(unittest.TestCase):
+    def setUp(self):
+        super(MultiIssuerOIDCTokenValidator, self).setUp()
+        self.addCleanup(patch.stopall)
+        self.github = MagicMock()
+        self.ghes = MagicMock()
+        self.v = oidc.MultiIssuerOIDCTokenValidator(
+            validators={
+                oidc.GITHUB_OPENID_ISSUER_URI: self.github,
+                "https://github.example.com/_services/token": self.ghes,
+            }
+        )
+
+    def test_verify_token(self):
+        token = utils.read_jwt("data/jwts/expired.txt")
+        self.github.verify_token.return_value = {"sub": "sub"}
+        self.assertEqual({"sub": "sub"}, self.v.verify_token(token))
+        self.github.verify_token.assert_called_once_with(token_string=token)
+        self.ghes.verify_token.assert_not_called()
+
+    def test_verify_token_untrusted_issuer(self):
+        # NOTE: The JWT does not include an 'iss' claim.
+        token = utils.read_jwt("data/jwts/default.txt")
+        self.assertIsNone(self.v.verify_token(token))
+        self.github.verify_token.assert_not_called()
+        self.ghes.verify_token.assert_not_called()
+
+    def test_verify_token_cached(self):
+        self.v.cache = ExpiringCache()
+        token = utils.read_jwt("data/jwts/expired.txt")
+        claims = ActionsClaims({"exp": int(time.time()) + 60})
+        self.github.verify_token.return_value = claims
+        self.assertIs(claims, self.v.verify_token(token))
+        self.assertIs(claims, self.v.verify_token(token))
+        self.github.verify_token.assert_called_once()
+        # Invalid OIDC tokens are not cached.
+        self.v.cache.clear()
+        self.github.verify_token.return_value = None
+        self.assertIsNone(self.v.verify_token(token))
+        self.assertIsNone(self.v.verify_token(token))
+        self.assertEqual(3, self.github.verify_token.call_count)
+
+    def test_authenticate_token(self):
+        token = utils.read_jwt("data/jwts/expired.txt")
+        self.github.verify_token.return_value = {"sub": "sub"}
+        with Flask(__name__).app_context():
+            self.assertEqual({"sub": "sub"}, self.v.authenticate_token(token))
+            self.assertEqual({"sub": "sub"}, g.actions_claims)
+
+    def test_authenticate_token_audit(self):
+        self.v.audit = MagicMock()
+        token = utils.read_jwt("data/jwts/expired.txt")
+        self.github.verify_token.return_value = {"sub": "sub"}
+        with Flask(__name__).test_request_context("/v1/auth"):
+            self.v.authenticate_token(token)
+        self.v.audit.record.assert_called_once_with(
+            "authenticate", {"sub": "sub"}, method="GET", path="/v1/auth"
+        )
+        # Failed authentication is not recorded.
+        self.v.audit.reset_mock()
+        self.github.verify_token.return_value = None
+        with Flask(__name__).test_request_context("/v1/auth"):
+            self.v.authenticate_token(token)
+        self.v.audit.record.assert_not_called()
+
+
+class JWKSCache(unittest.TestCase):
+    def setUp(self):
+        super(JWKSCache, self).setUp()
+        self.addCleanup(patch.stopall)
+        self.kid = "78167F727DEC5D801DD1C8784C704A1C880EC0E1"
+        self.fetch_jwk_set = MagicMock(return_value=utils.read_jwk_set(self.kid))
+        self.c = oidc.JWKSCache(fetch_jwk_set=self.fetch_jwk_set)
+
+    def test_get(self):
+        self.assertEqual(self.kid, self.c.get(self.kid).kid)
+        self.assertEqual(self.kid, self.c.get(self.kid).kid)
+        self.fetch_jwk_set.assert_called_once()
+
+    def test_get_stale(self):
+        self.c.ttl, self.c.min_refresh_interval = 0, 0
+        self.c.get(self.kid)
+        self.c.get(self.kid)
+        self.assertEqual(2, self.fetch_jwk_set.call_count)
+
+    def test_get_unknown_kid(self):
+        self.c.get(self.kid)
+        # Refreshes are limited to one every `min_refresh_interval` seconds.
+        self.assertIsNone(self.c.get("unknown"))
+        self.fetch_jwk_set.assert_called_once()
+        self.c.min_refresh_interval = 0
+        self.assertIsNone(self.c.get("unknown"))
+        self.assertEqual(2, self.fetch_jwk_set.call_count)
+
+    def test_get_unknown_kid_after_refresh(self):
+        self.c.refresh()
+        # A key published after the last refresh of the JWKS is fetched, even
+        # within `min_refresh_interval` seconds of the refresh.
+        self.fetch_jwk_set.return_value = utils.read_jwk_set("new")
+        self.assertEqual("new", self.c.get("new").kid)
+        self.assertEqual(2, self.fetch_jwk_set.call_count)
+
+    def test_get_unknown_kid_concurrent(self):
+        self.c.refresh()
+        jwk_set = utils.read_jwk_set("new")
+
+        def fetch_jwk_set():
+            time.sleep(0.05)
+            return jwk_set
+
+        self.fetch_jwk_set.side_effect = fetch_jwk_set
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            keys = list(executor.map(lambda _: self.c.get("new"), range(8)))
+        # Threads wait on a single refresh.
+        self.assertEqual(["new"] * 8, [x.kid for x in keys])
+        self.assertEqual(2, self.fetch_jwk_set.call_count)
+
+    def test_get_refresh_error(self):
+        self.c.get(self.kid)
+        self.c.ttl, self.c.min_refresh_interval = 0, 0
+        self.fetch_jwk_set.side_effect = RuntimeError
+        # Stale keys are used if the JWKS cannot be refreshed.
+        self.assertEqual(self.kid, self.c.get(self.kid).kid)
+        self.assertEqual(2, self.fetch_jwk_set.call_count)
+
+    def test_get_kid_invalid(self):
+        # Rejected without fetching the JWKS.
+        for kid in [[self.kid], {"kid": self.kid}, 1, None]:
+            self.assertIsNone(self.c.get(kid))
+        self.fetch_jwk_set.assert_not_called()
+
+    def test_call(self):
+        self.assertEqual(self.kid, self.c({"kid": self.kid}, {}).kid)
+        with self.assertRaises(InvalidTokenError):
+            self.c({"kid": "unknown"}, {})
+        with self.assertRaises(InvalidTokenError):
+            self.c({"kid": ["unknown"]}, {})
+
+    def test_warm(self):
+        self.c.warm(blocking=True)
+        self.fetch_jwk_set.assert_called_once()
+        # The JWKS is fresh.
+        self.c.warm(blocking=True)
+        self.fetch_jwk_set.assert_called_once()
+        self.assertEqual(self.kid, self.c.get(self.kid).kid)
+        self.fetch_jwk_set.assert_called_once()
+
+    def test_warm_error(self):
+        self.fetch_jwk_set.side_effect = RuntimeError
+        # Errors are not raised.
+        self.c.warm(blocking=True)
+        # Attempts are limited to one every `min_refresh_interval` seconds.
+        self.c.warm(blocking=True)
+        self.fetch_jwk_set.assert_called_once()
+        self.assertEqual(1, self.c.failures)
+        self.c.min_refresh_interval = 0
+        self.fetch_jwk_set.side_effect = None
+        self.c.warm(blocking=True)
+        self.assertEqual(0, self.c.failures)
+
+    def test_status(self):
+        self.assertEqual(
+            {
+                "keys": 0,
+                "age": None,
+                "fresh": False,
+                "refreshing": False,
+                "failures": 0,
+            },
+            self.c.status(),
+        )
+        self.c.refresh()
+        status = self.c.status()
+        self.assertEqual(1, status["keys"])
+        self.assertTrue(status["fresh"])
+
+
+class ReadUnverifiedIssuer(unittest.TestCase):
+    def test_read_unverified_issuer(self):
+        token = utils.read_jwt("data/jwts/expired.txt")
+        self.assertEqual(
+            oidc.GITHUB_OPENID_ISSUER_URI, oidc.read_unverified_issuer(token)
+        )
+
+    def test_read_unverified_issuer_malformed(self):
+        self.assertIsNone(oidc.read_unverified_issuer("bad"))
+        self.assertIsNone(oidc.read_unverified_issuer("xxxxx.yyyyy.zzzzz"))
+        # The 'iss' claim is not a string.
+        for iss in [[oidc.GITHUB_OPENID_ISSUER_URI], {"iss": "x"}, 1, None]:
+            payload = base64.urlsafe_b64encode(json.dumps({"iss": iss}).encode())
+            token = f"xxxxx.{payload.decode().rstrip('=')}.zzzzz"
+            self.assertIsNone(oidc.read_unverified_issuer(token))
+
+
+class OpenIDConfigurationURI(unittest.TestCase):
+    def test_openid_configuration_uri(self):
+        self.assertEqual(
+            oidc.GITHUB_OPENID_CONFIGURATION_URI,
+            oidc.openid_configuration_uri(oidc.GITHUB_OPENID_ISSUER_URI),
+        )
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limiting tests.
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src import ratelimit
+
+CLAIMS = {"repository": "nickolashkraus/flask-oidc", "actor": "nickolashkraus"}
+
+
+class MemoryBackend(unittest.TestCase):
+    def setUp(self):
+        super(MemoryBackend, self).setUp()
+        self.addCleanup(patch.stopall)
+        self.now = 1000.0
+        mock_time = patch.object(ratelimit, "time").start()
+        mock_time.monotonic.side_effect = lambda: self.now
+        self.b = ratelimit.MemoryBackend()
+
+    def test_consume(self):
+        # Bucket: 2 tokens, refills at 1 token per 10 seconds.
+        self.assertIsNone(self.b.consume([("a", 2, 20)]))
+        self.assertIsNone(self.b.consume([("a", 2, 20)]))
+        self.assertEqual((0, 10), self.b.consume([("a", 2, 20)]))
+        # Buckets are independent.
+        self.assertIsNone(self.b.consume([("b", 2, 20)]))
+
+    def test_consume_all_or_nothing(self):
+        self.assertIsNone(self.b.consume([("a", 2, 20), ("b", 1, 10)]))
+        # Bucket 'b' is empty, so no token is consumed from bucket 'a'.
+        self.assertEqual((1, 10), self.b.consume([("a", 2, 20), ("b", 1, 10)]))
+        self.assertEqual((1, 10), self.b.consume([("a", 2, 20), ("b", 1, 10)]))
+        self.assertIsNone(self.b.consume([("a", 2, 20)]))
+        # The bucket with the longest wait is reported.
+        self.assertEqual((0, 10), self.b.consume([("a", 2, 20), ("b", 1, 10)]))
+
+    def test_consume_refill(self):
+        self.b.consume([("a", 1, 10)])
+        self.now += 5
+        self.assertEqual((0, 5), self.b.consume([("a", 1, 10)]))
+        self.now += 5
+        self.assertIsNone(self.b.consume([("a", 1, 10)]))
+
+    def test_prune(self):
+        patch.object(ratelimit, "LOCK_STRIPES", 1).start()
+        patch.object(ratelimit, "MAX_BUCKETS_PER_STRIPE", 1).start()
+        b = ratelimit.MemoryBackend()
+        b.consume([("a", 1, 10)])
+        b.consume([("b", 1, 10)])
+        self.now += 10
+        # Buckets 'a' and 'b' have refilled and are removed.
+        b.consume([("c", 1, 10)])
+        self.assertEqual(["c"], list(b._stripes[0]))
+
+
+class RedisBackend(unittest.TestCase):
+    def test_consume(self):
+        client = MagicMock()
+        client.register_script.return_value.return_value = [2, b"2.5"]
+        b = ratelimit.RedisBackend(client)
+        self.assertEqual((1, 2.5), b.consume([("a", 1, 10), ("b", 2, 20)]))
+        _, kwargs = client.register_script.return_value.call_args
+        self.assertEqual(
+            ["flask-oidc:ratelimit:a", "flask-oidc:ratelimit:b"], kwargs["keys"]
+        )
+        self.assertEqual([1, 10, 2, 20], kwargs["args"][1:])
+        client.register_script.return_value.return_value = [0, b"0"]
+        self.assertIsNone(b.consume([("a", 1, 10), ("b", 2, 20)]))
+
+
+class RateLimiter(unittest.TestCase):
+    def setUp(self):
+        super(RateLimiter, self).setUp()
+        self.r = ratelimit.RateLimiter(
+            [
+                {"claim": "repository", "limit": 2, "period": 60},
+                {"claim": "actor", "limit": 1, "period": 60},
+            ]
+        )
+
+    def test_acquire(self):
+        self.assertIsNone(self.r.acquire(CLAIMS))
+        claim, retry_after = self.r.acquire(CLAIMS)
+        self.assertEqual("actor", claim)
+        self.assertGreater(retry_after, 59)
+        # The rejected request did not consume from the 'repository' limit.
+        self.assertIsNone(self.r.acquire(dict(CLAIMS, actor="octocat")))
+        claim, _ = self.r.acquire(dict(CLAIMS, actor="monalisa"))
+        self.assertEqual("repository", claim)
+
+    def test_acquire_rejected_does_not_consume_quota(self):
+        r = ratelimit.RateLimiter(
+            [
+                {"claim": "repository_owner", "limit": 5, "period": 86400},
+                {"claim": "repository", "limit": 1, "period": 60},
+            ]
+        )
+        self.assertIsNone(r.acquire(CLAIMS))
+        # Retries rejected by the 'repository' limit.
+        for _ in range(4):
+            claim, _ = r.acquire(CLAIMS)
+            self.assertEqual("repository", claim)
+        # Other repositories of the owner are not locked out.
+        for i in range(4):
+            claims = dict(CLAIMS, repository=f"nickolashkraus/repo-{i}")
+            self.assertIsNone(r.acquire(claims))
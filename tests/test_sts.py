@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+AWS credential vending tests.
+"""
+import unittest
+from unittest.mock import patch
+
+from src import sts
+from src.cache import ExpiringCache
+
+from . import utils
+
+CLAIMS = {
+    "repository": "nickolashkraus/flask-oidc",
+    "ref": "refs/heads/master",
+    "run_id": "3989419862",
+    "run_attempt": "1",
+}
+
+POLICY = [
+    {
+        "role_arn": "arn:aws:iam::123456789012:role/deploy",
+        "claims": {"repository": "nickolashkraus/*", "ref": "refs/heads/master"},
+    },
+    {
+        "role_arn": "arn:aws:iam::123456789012:role/read-only",
+        "claims": {"repository": "nickolashkraus/*"},
+        "mode": sts.ASSUME_ROLE,
+    },
+]
+
+
+class SelectRole(unittest.TestCase):
+    def test_select_role(self):
+        self.assertEqual(POLICY[0], sts.select_role(POLICY, CLAIMS))
+        claims = dict(CLAIMS, ref="refs/heads/feature")
+        self.assertEqual(POLICY[1], sts.select_role(POLICY, claims))
+
+    def test_select_role_no_match(self):
+        claims = dict(CLAIMS, repository="octocat/hello-world")
+        self.assertIsNone(sts.select_role(POLICY, claims))
+
+
+class RoleSessionName(unittest.TestCase):
+    def test_role_session_name(self):
+        key = sts.session_key(POLICY[0], CLAIMS)
+        self.assertEqual(
+            "nickolashkraus-flask-oidc@3989419862@1", sts.role_session_name(key)
+        )
+
+    def test_role_session_name_long(self):
+        name = sts.role_session_name(("x" * 100,))
+        self.assertEqual(64, len(name))
+        self.assertNotEqual(name, sts.role_session_name(("x" * 101,)))
+
+
+class VendCredentials(unittest.TestCase):
+    def setUp(self):
+        super(VendCredentials, self).setUp()
+        self.addCleanup(patch.stopall)
+        self.sts_client = utils.MockSTSClient()
+        mock_boto3 = patch.object(sts, "boto3").start()
+        mock_boto3.client.return_value = self.sts_client
+        self.cache = ExpiringCache()
+
+    def test_vend_credentials(self):
+        creds, hit = sts.vend_credentials(self.cache, POLICY[0], CLAIMS, "token")
+        self.assertFalse(hit)
+        self.assertEqual(1, creds["Version"])
+        self.assertEqual("ASIA1", creds["AccessKeyId"])
+        method, kwargs = self.sts_client.calls[0]
+        self.assertEqual("assume_role_with_web_identity", method)
+        self.assertEqual("token", kwargs["WebIdentityToken"])
+        self.assertEqual(POLICY[0]["role_arn"], kwargs["RoleArn"])
+
+    def test_vend_credentials_assume_role(self):
+        sts.vend_credentials(self.cache, POLICY[1], CLAIMS, "token")
+        method, kwargs = self.sts_client.calls[0]
+        self.assertEqual("assume_role", method)
+        self.assertNotIn("WebIdentityToken", kwargs)
+
+    def test_vend_credentials_cached(self):
+        sts.vend_credentials(self.cache, POLICY[0], CLAIMS, "token")
+        # A retry presenting the same OIDC token.
+        creds, hit = sts.vend_credentials(self.cache, POLICY[0], CLAIMS, "token")
+        self.assertTrue(hit)
+        self.assertEqual("ASIA1", creds["AccessKeyId"])
+        self.assertEqual(1, len(self.sts_client.calls))
+
+    def test_vend_credentials_web_identity_per_token(self):
+        # Jobs in the same workflow run with different 'sub' claims (ex. an
+        # environment). The trust policy of the IAM role may allow only one.
+        prod = dict(CLAIMS, sub="repo:nickolashkraus/flask-oidc:environment:prod")
+        test = dict(CLAIMS, sub="repo:nickolashkraus/flask-oidc:environment:test")
+        sts.vend_credentials(self.cache, POLICY[0], prod, "prod-token")
+        _, hit = sts.vend_credentials(self.cache, POLICY[0], test, "test-token")
+        self.assertFalse(hit)
+        # Each OIDC token reaches STS.
+        self.assertEqual(
+            ["prod-token", "test-token"],
+            [kwargs["WebIdentityToken"] for _, kwargs in self.sts_client.calls],
+        )
+
+    def test_vend_credentials_assume_role_cached(self):
+        sts.vend_credentials(self.cache, POLICY[1], CLAIMS, "token")
+        # Another job in the same workflow run.
+        creds, hit = sts.vend_credentials(self.cache, POLICY[1], CLAIMS, "other")
+        self.assertTrue(hit)
+        self.assertEqual(1, len(self.sts_client.calls))
+        # Another workflow run.
+        claims = dict(CLAIMS, run_id="3989419863")
+        _, hit = sts.vend_credentials(self.cache, POLICY[1], claims, "token")
+        self.assertFalse(hit)
+        # The same workflow run from another issuer.
+        claims = dict(CLAIMS, iss="https://github.example.com/_services/token")
+        _, hit = sts.vend_credentials(self.cache, POLICY[1], claims, "token")
+        self.assertFalse(hit)
+        self.assertEqual(3, len(self.sts_client.calls))
+
+    def test_vend_credentials_expiry_margin(self):
+        # Credentials expiring within the margin are not vended from the cache.
+        sts.vend_credentials(self.cache, POLICY[0], CLAIMS, "token", 3600)
+        _, hit = sts.vend_credentials(self.cache, POLICY[0], CLAIMS, "token", 3600)
+        self.assertFalse(hit)
+        self.assertEqual(2, len(self.sts_client.calls))
@@ -2,7 +2,14 @@
 """
 Utility functions.
 """
+import base64
+import datetime
+import json
 import os
+import time
+
+from authlib.jose import JsonWebKey, jwt
+from authlib.jose.rfc7518.rsa_key import RSAKey
 
 
 def read_public_key() -> str:
@@ -36,3 +43,87 @@ def read_jwt(filename: str) -> str:
         # Join lines
         jwt = "".join(lines)
     return jwt
+
+
+def read_jwk_set(kid: str = "78167F727DEC5D801DD1C8784C704A1C880EC0E1") -> dict:
+    """
+    Read the public key used for signing JWTs as a JSON Web Key Set (JWKS).
+
+    :type kid: str
+    :param kid: Key ID of the public key.
+
+    :rtype: dict
+    :return: JSON Web Key Set (JWKS)
+    """
+    public_key = JsonWebKey.import_key(read_public_key(), {"kid": kid, "use": "sig"})
+    return {"keys": [public_key.as_dict()]}
+
+
+class MockSTSClient(object):
+    """
+    Local stand-in for the AWS Security Token Service (STS) client.
+
+    Records the parameters of each call and returns credentials valid for the
+    requested duration.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def assume_role(self, **kwargs) -> dict:
+        self.calls.append(("assume_role", kwargs))
+        return self._credentials(kwargs)
+
+    def assume_role_with_web_identity(self, **kwargs) -> dict:
+        self.calls.append(("assume_role_with_web_identity", kwargs))
+        return self._credentials(kwargs)
+
+    def _credentials(self, kwargs: dict) -> dict:
+        n = len(self.calls)
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            seconds=kwargs.get("DurationSeconds", 3600)
+        )
+        return {
+            "Credentials": {
+                "AccessKeyId": f"ASIA{n}",
+                "SecretAccessKey": f"secret{n}",
+                "SessionToken": f"token{n}",
+                "Expiration": expiration,
+            }
+        }
+
+
+def generate_private_key(kid: str = "test") -> RSAKey:
+    """
+    Generate a private key for signing JWTs.
+
+    :type kid: str
+    :param kid: Key ID of the private key.
+
+    :rtype: RSAKey
+    :return: Private key
+    """
+    return JsonWebKey.generate_key("RSA", 2048, {"kid": kid}, is_private=True)
+
+
+def generate_jwt(private_key: RSAKey, **claims) -> str:
+    """
+    Generate a JWT resembling one from GitHub's OIDC Provider.
+
+    The payload is that of data/jwts/expired.txt, with new 'iat', 'nbf', and
+    'exp' claims (valid for 5 minutes).
+
+    :type private_key: RSAKey
+    :param private_key: Private key used to sign the JWT.
+    :type claims: dict
+    :param claims: Claims overriding those of the payload.
+
+    :rtype: str
+    :return: JWT
+    """
+    payload = read_jwt("data/jwts/expired.txt").split(".")[1]
+    payload = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    now = int(time.time())
+    payload.update({"iat": now, "nbf": now, "exp": now + 300}, **claims)
+    header = {"alg": "RS256", "typ": "JWT", "kid": private_key.kid}
+    return jwt.encode(header, payload, private_key).decode()